@@ -1,88 +1,690 @@
 import bisect
-from node import Node
+import gc
+import os
+import random
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import contextmanager
+from node import Node, in_range
+from ring import ArrayRing, np
+from src.common.column_store import ColumnStore
+from src.common.location_cache import LocationCache
+from src.common.scatter_gather import scatter_gather
 import xxhash
-from typing import Dict, Optional, List, Any
+from typing import Callable, Deque, Dict, Optional, List, Any, Iterable, Iterator, Tuple
 
 class DHT:
-    def __init__(self, m_bits: int):
+    def __init__(self, m_bits: int, array_ring: bool = False, cache_size: int = 0, successor_list_len: int = 3, vnodes: int = 1):
         self.m_bits = m_bits #number of bits the hash algorithm supports
         self.M = 1 << m_bits #left shift of m
         self.mask = self.M - 1
         self.nodes: List[Node] = [] #list of all the nodes the DHT has
+        self.table: List[Optional[Node]] = [] #slot -> node, fingers are stored as slots into this table
+        self._free_slots: List[int] = [] #table slots of departed nodes that no finger points to, reused by joins
+        self._dead_slots: List[int] = [] #slots of crashed nodes, stale fingers may still point to them
+        self.ids: List[int] = [] #sorted node ids, kept parallel to self.nodes
+        self.successor_list_len = successor_list_len #r, how many successors every node keeps track of
+        self.vnodes = vnodes #ring positions (tokens) per physical node, more of them even out the arcs each one owns
+        self.hosts: Dict[str, List[Node]] = {} #physical node name -> its tokens on the ring
+        self.epoch = 0 #bumped on every topology change so cached ring state can be dropped
+        self.array_ring = array_ring #route on a numpy id array + finger index matrix instead of Node references
+        self.ring: Optional[ArrayRing] = None
+        self._batch_ring: Optional[ArrayRing] = None #arrays used by the batch operations when array_ring is off
+        self._batch_ring_epoch = -1
+        self._next_finger = 0 #first finger fix_fingers refreshes in the next stabilize round
+        self._lazy = False #join_lazy/fail were used, the pointers may lag behind the membership list until a full relink
+        self._replicas: Dict[Tuple[int, int], List[Node]] = {} #(owner id, r) -> replica nodes, valid for one ring epoch
+        self._replicas_epoch = -1
+        self.cache: Optional[LocationCache] = LocationCache(cache_size) if cache_size > 0 else None #key id -> owner, for repeated gets
 
     def _hash_key(self, key: str) -> int:
         return xxhash.xxh64(str(key)).intdigest() & self.mask #hashing algorithm, converted to an int
 
+    def _hash_keys(self, keys: List[str]) -> List[int]:
+        mask = self.mask
+        return [xxhash.xxh64_intdigest(str(key)) & mask for key in keys]
+
+    def _token_names(self, name: str) -> List[str]:
+        #with a single token the node sits where its name hashes, as without virtual nodes
+        return [name] if self.vnodes == 1 else [f"{name}#{v}" for v in range(self.vnodes)]
+
+    def _id_taken(self, node_id: int) -> bool:
+        pos = bisect.bisect_left(self.ids, node_id)
+        return pos < len(self.ids) and self.ids[pos] == node_id
+
+    def _free_tokens(self, node_names: Iterable[str]) -> List[Tuple[str, int]]:
+        #(host, id) for every token whose id is not on the ring yet. Two nodes on one id would make (pred, new] the
+        #whole ring for the fingers, the key hand-off and the lookups, so a token hashing onto a taken id is left out
+        #(it could never own a key anyway). Only happens with a small m
+        hosts = [(name, token) for name in node_names for token in self._token_names(name)]
+        seen = set()
+        free = []
+        for (name, _), h in zip(hosts, self._hash_keys([token for _, token in hosts])): #hash every token up front
+            if h in seen or self._id_taken(h):
+                continue
+            seen.add(h)
+            free.append((name, h))
+        return free
+
+    def _new_node(self, node_id: int) -> Node:
+        return Node(node_id, self.m_bits, self.table, self._free_slots.pop() if self._free_slots else None)
+
+    def _release_slot(self, node: Node) -> None:
+        #the table keeps its size under churn: a slot is reused once no finger can still lead to it. After leave the
+        #fingers are redirected on the spot, after a crash (or any lazy churn) only once fix_fingers replaced them
+        self.table[node.slot] = None
+        (self._dead_slots if self._lazy else self._free_slots).append(node.slot)
+
+    def _reclaim_slots(self) -> None:
+        referenced = set()
+        for node in self.nodes:
+            referenced.update(node.fingers)
+        self._free_slots.extend(slot for slot in self._dead_slots if slot not in referenced)
+        self._dead_slots = [slot for slot in self._dead_slots if slot in referenced]
+
+    def _add_host(self, name: str, node: Node) -> None:
+        node.host = name
+        self.hosts.setdefault(name, []).append(node)
+
+    def _drop_token(self, node: Node) -> None:
+        tokens = self.hosts.get(node.host)
+        if tokens is not None:
+            tokens.remove(node)
+            if not tokens:
+                del self.hosts[node.host]
+
     def _sorted_ids(self) -> List[int]:
-        return [n.id for n in self.nodes] # node sorting based on it's id
+        return self.ids # node ids, already sorted since the ring is kept in order
 
     def _link_ring(self) -> None:
         n = len(self.nodes)
         for i, node in enumerate(self.nodes):
             node.successor = self.nodes[(i + 1) % n] #set each node's successor
             node.predecessor = self.nodes[(i - 1) % n] #set each node's predecessor
+            self._fill_successor_list(i)
+
+    def _fill_successor_list(self, pos: int) -> None:
+        n = len(self.nodes)
+        self.nodes[pos].successors = [self.nodes[(pos + j) % n] for j in range(1, min(self.successor_list_len, n - 1) + 1)]
+
+    def _refresh_successor_lists(self, pos: int) -> None:
+        #after a change at ring position pos only the r nodes before it (and the node at pos) see a different list
+        n = len(self.nodes)
+        for p in dict.fromkeys((pos - j) % n for j in range(min(self.successor_list_len, n - 1) + 1)):
+            self._fill_successor_list(p)
 
     def _rebuild_finger_tables(self) -> None:
         if not self.nodes: return
-        ids = self._sorted_ids()
-        n_nodes = len(self.nodes)
-        
+
         #rebuilding all finger tables for all nodes
 
         for node in self.nodes:
-            for i in range(self.m_bits):
-                start = (node.id + (1 << i)) & self.mask
-                pos = bisect.bisect_left(ids, start)
-                node.fingers[i] = self.nodes[pos % n_nodes]
+            self._fill_fingers(node)
+
+    def _ring_changed(self) -> None:
+        self.epoch += 1
+        if self.array_ring:
+            self._build_array_ring()
+
+    def _build_array_ring(self) -> ArrayRing:
+        self.ring = ArrayRing(self.nodes, self.m_bits) #all the fingers in one searchsorted call
+        for node in self.nodes:
+            node.ring = self.ring
+        return self.ring
+
+    def _routing_arrays(self) -> Optional[ArrayRing]:
+        if self.array_ring:
+            return self.ring
+        if np is None or not self.nodes:
+            return None
+        if self._batch_ring_epoch != self.epoch: #rebuild only after the ring changed
+            self._batch_ring = ArrayRing(self.nodes, self.m_bits)
+            self._batch_ring_epoch = self.epoch
+        return self._batch_ring
+
+    def _route_many(self, key_ids: List[int]) -> Tuple[List[Node], List[int]]:
+        #the arrays are built from the membership list, so after lazy churn they would route on the ideal ring
+        #instead of the pointers the nodes actually hold
+        ring = None if self._lazy else self._routing_arrays()
+        if ring is None: #no numpy or stale pointers, route one key at a time
+            routed = [self.find_successor(h) for h in key_ids]
+            return [owner for owner, _ in routed], [hops for _, hops in routed]
+        idx, hops = ring.route_many(key_ids)
+        nodes = ring.nodes
+        return [nodes[i] for i in idx.tolist()], hops.tolist()
+
+    def _route_cached(self, key_ids: List[int]) -> Tuple[List[Node], List[int]]:
+        #owners already in the location cache are one hop away like in get, the rest are routed together and cached
+        if self.cache is None:
+            return self._route_many(key_ids)
+        cache, epoch = self.cache, self.epoch
+        owners = [cache.get(h, epoch) for h in key_ids]
+        hops = [1] * len(key_ids)
+        todo = [i for i, owner in enumerate(owners) if owner is None]
+        if todo:
+            routed, routed_hops = self._route_many([key_ids[i] for i in todo])
+            for i, owner, h in zip(todo, routed, routed_hops):
+                owners[i], hops[i] = owner, h
+                cache.put(key_ids[i], owner, epoch)
+        return owners, hops
+
+    def _owner_indices(self, key_ids: List[int]) -> List[int]:
+        #ring position of each key's owner, straight from the sorted ids instead of routing every key
+        ring = self._routing_arrays()
+        if ring is not None:
+            return ring.successor_index(key_ids).tolist()
+        ids, n_nodes = self.ids, len(self.ids)
+        return [bisect.bisect_left(ids, h) % n_nodes for h in key_ids]
+
+    def _replica_nodes(self, owner: Node, r: int) -> List[Node]:
+        #the node opposite to the owner and its successors, computed once per owner until the ring changes
+        if self._replicas_epoch != self.epoch:
+            self._replicas.clear()
+            self._replicas_epoch = self.epoch
+        cached = self._replicas.get((owner.id, r))
+        if cached is not None:
+            return cached
+        half_ring = 1 << (self.m_bits - 1)
+        n_nodes = len(self.nodes)
+        start = bisect.bisect_left(self.ids, (owner.id + half_ring) & self.mask)
+        replicas = []
+        owner_host = owner.host if owner.host is not None else owner.id
+        hosts = set() #r distinct physical nodes, further tokens of a host already counted are skipped
+        for j in range(n_nodes):
+            if len(hosts) == r:
+                break
+            node = self.nodes[(start + j) % n_nodes]
+            host = node.host if node.host is not None else node.id
+            if host in hosts:
+                continue
+            hosts.add(host)
+            if host != owner_host: #the owner already has the value
+                replicas.append(node)
+        self._replicas[(owner.id, r)] = replicas
+        return replicas
+
+    def _index_of(self, node: Node) -> int:
+        pos = bisect.bisect_left(self.ids, node.id) #position of the node in the sorted ring
+        if pos == len(self.ids) or self.nodes[pos] is not node:
+            raise ValueError(f"Node is not part of this DHT")
+        return pos
+
+    def _fill_fingers(self, node: Node) -> None:
+        nodes, ids, mask = self.nodes, self.ids, self.mask
+        n_nodes = len(nodes)
+        fingers = node.fingers
+        for i in range(self.m_bits):
+            start = (node.id + (1 << i)) & mask
+            fingers[i] = nodes[bisect.bisect_left(ids, start) % n_nodes].slot
+
+    def _redirect_fingers(self, lo: int, hi: int, target: Node) -> None:
+        # every finger whose start falls in (lo, hi] has to point to target.
+        # finger i of node p starts at p.id + 2^i, so only the nodes with an id in (lo - 2^i, hi - 2^i] are affected
+        n_nodes = len(self.nodes)
+        target_slot = target.slot
+        for i in range(self.m_bits):
+            a = (lo - (1 << i)) & self.mask
+            b = (hi - (1 << i)) & self.mask
+            pos = bisect.bisect_right(self.ids, a)
+            for k in range(n_nodes):
+                p = self.nodes[(pos + k) % n_nodes]
+                if not in_range(p.id, a, b):
+                    break
+                p.fingers[i] = target_slot
 
     def find_successor(self, key_id: int):
         if not self.nodes: return None, 0
         return self.nodes[0].find_successor(key_id)
 
     def join(self, node_name: str) -> Node:
-        hashed = self._hash_key(node_name) #hashing the node name
-        new_node = Node(hashed, self.m_bits) # creating the node instance
-        bisect.insort(self.nodes, new_node, key=lambda x: x.id) #insert the node in the correct position in the nodes list
-        self._link_ring() #set the new node's successor & predecessor plus it's neighboor's
-        self._rebuild_finger_tables() # rebuild the finger tables for the node and all the nodes before him
+        #every token of the physical node joins on its own, the first one is returned (all of them: hosts[node_name])
+        tokens = [self._join_token(hashed, host) for host, hashed in self._free_tokens([node_name])]
+        if not tokens:
+            raise ValueError(f"every ring position of {node_name} is already taken")
+        return tokens[0]
+
+    def _join_token(self, hashed: int, host: str) -> Node:
+        new_node = self._new_node(hashed) # creating the node instance
+        self._add_host(host, new_node)
+        pos = bisect.bisect_right(self.ids, hashed) #insert the node in the correct position in the nodes list
+        self.ids.insert(pos, hashed)
+        self.nodes.insert(pos, new_node)
+        n_nodes = len(self.nodes)
+        pred = self.nodes[(pos - 1) % n_nodes]
+        succ = self.nodes[(pos + 1) % n_nodes]
+        new_node.predecessor, new_node.successor = pred, succ #set the new node's successor & predecessor plus it's neighboor's
+        pred.successor = new_node
+        succ.predecessor = new_node
+        if not self.array_ring:
+            if n_nodes > 1:
+                self._redirect_fingers(pred.id, new_node.id, new_node) #only the fingers starting in (pred, new] now point to the new node
+            self._fill_fingers(new_node)
+        self._refresh_successor_lists(pos)
+        if n_nodes > 1:
+            succ.hand_off(new_node, pred.id) #the keys in (pred, new] move from the successor to the new node
+        self._ring_changed()
         return new_node
-    
+
+    def bulk_join(self, node_names: Iterable[str]) -> List[Node]:
+        hosts = self._free_tokens(node_names)
+        new_nodes = [self._new_node(h) for _, h in hosts]
+        for (name, _), node in zip(hosts, new_nodes):
+            self._add_host(name, node)
+        had_nodes = bool(self.nodes)
+        self.nodes.extend(new_nodes)
+        self.nodes.sort(key=lambda x: x.id) #sort the ring once instead of once per node
+        self.ids = [n.id for n in self.nodes]
+        self._link_ring()
+        if not self.array_ring:
+            self._rebuild_finger_tables() #a single pass over all the finger tables
+        if had_nodes:
+            self._hand_off_joined(new_nodes)
+        self._lazy = False #every pointer was just rebuilt from the membership list
+        self._free_slots.extend(self._dead_slots)
+        self._dead_slots = []
+        self._ring_changed()
+        return new_nodes
+
+    def _hand_off_joined(self, new_nodes: List[Node]) -> None:
+        #each new node takes (its predecessor, itself] from the first old node after it, as join does one node at a time.
+        #Walking the ring backwards from an old node keeps that node at hand for the run of new nodes before it
+        new = set(map(id, new_nodes))
+        n_nodes = len(self.nodes)
+        start = next(i for i, node in enumerate(self.nodes) if id(node) not in new)
+        succ = self.nodes[start]
+        for j in range(1, n_nodes):
+            pos = (start - j) % n_nodes
+            node = self.nodes[pos]
+            if id(node) in new:
+                succ.hand_off(node, self.nodes[pos - 1].id)
+            else:
+                succ = node
+
+    @classmethod
+    def from_node_names(cls, node_names: Iterable[str], m_bits: int, array_ring: bool = False, cache_size: int = 0,
+                        vnodes: int = 1) -> "DHT":
+        d = cls(m_bits, array_ring, cache_size, vnodes=vnodes)
+        d.bulk_join(node_names)
+        return d
+
     def leave(self, node: Node):
         if node is None:
             raise ValueError(f"Node is not part of this DHT") 
 
         if len(self.nodes) == 1:
             node.data.clear()
+            self._drop_token(node)
             self.nodes.clear()
+            self.ids.clear()
+            self._release_slot(node)
+            self.ring = None
+            self.epoch += 1
             return
 
-        self.nodes.remove(node) #sudden node failure simulation
-        self._link_ring()
-        self._rebuild_finger_tables()
+        pos = self._index_of(node)
+        del self.nodes[pos] #sudden node failure simulation
+        self._drop_token(node)
+        self._release_slot(node) #nothing points to the slot anymore once the fingers are redirected below
+        del self.ids[pos]
+        n_nodes = len(self.nodes)
+        pred = self.nodes[(pos - 1) % n_nodes]
+        succ = self.nodes[pos % n_nodes]
+        pred.successor = succ
+        succ.predecessor = pred
+        self._refresh_successor_lists(pos % n_nodes)
+        if not self.array_ring:
+            self._redirect_fingers(pred.id, node.id, succ) #fingers that pointed to the departed node move to its successor
+        self._ring_changed()
+
+    def leave_host(self, node_name: str) -> None:
+        #the physical node goes away with all of its tokens
+        for node in list(self.hosts.get(node_name, [])):
+            self.leave(node)
+
+    # -----------------------------
+    # Churn without global repair: join_lazy / fail only touch the membership list,
+    # the nodes fix their pointers themselves over stabilize rounds
+    # -----------------------------
+    def _check_lazy(self) -> None:
+        if self.array_ring:
+            raise ValueError("the stabilization protocol runs on the node pointers, build the DHT with array_ring=False")
+
+    def join_lazy(self, node_name: str, bootstrap: Optional[Node] = None) -> Node:
+        #standard Chord join: the new node only learns its successor, through a lookup from a node already in the ring
+        self._check_lazy()
+        self._lazy = True
+        tokens = [self._join_token_lazy(hashed, host, bootstrap) for host, hashed in self._free_tokens([node_name])]
+        if not tokens:
+            raise ValueError(f"every ring position of {node_name} is already taken")
+        return tokens[0]
+
+    def _join_token_lazy(self, hashed: int, host: str, bootstrap: Optional[Node]) -> Node:
+        new_node = self._new_node(hashed)
+        self._add_host(host, new_node)
+        if self.nodes:
+            entry = bootstrap if bootstrap is not None else self.nodes[0]
+            succ, _ = entry.find_successor(hashed)
+            new_node.successor = succ
+            new_node.successors = [succ]
+            new_node.fingers[0] = succ.slot
+        pos = bisect.bisect_right(self.ids, hashed)
+        self.ids.insert(pos, hashed)
+        self.nodes.insert(pos, new_node)
+        self._ring_changed()
+        return new_node
+
+    def fail(self, node: Node) -> None:
+        #crash without warning: the other nodes find out through check_predecessor and their successor lists
+        self._check_lazy()
+        self._lazy = True
+        pos = self._index_of(node)
+        del self.nodes[pos]
+        del self.ids[pos]
+        self._release_slot(node)
+        self._drop_token(node)
+        self._ring_changed()
+
+    def stabilize_round(self, fingers_per_round: int = 1) -> None:
+        #one period of the protocol on every live node: the work is O(1 + fingers_per_round) lookups per node
+        for node in list(self.nodes):
+            node.check_predecessor()
+            node.stabilize(self.successor_list_len)
+            node.fix_fingers(self._next_finger, fingers_per_round)
+        self._next_finger = (self._next_finger + fingers_per_round) % self.m_bits
+        if self._dead_slots:
+            self._reclaim_slots()
+        self.epoch += 1 #pointers moved, cached owners may be stale
+
+    def ring_health(self, key_ids: List[int]) -> Dict[str, float]:
+        #how far the pointers are from the ideal ring, measured against the membership list
+        n_nodes = len(self.nodes)
+        if not n_nodes:
+            return {"lookups_ok": 1.0, "avg_hops": 0.0, "successors_ok": 1.0, "fingers_ok": 1.0}
+        correct = 0
+        hops = 0
+        for h in key_ids:
+            owner, hop = self.find_successor(h)
+            correct += owner is self.nodes[bisect.bisect_left(self.ids, h) % n_nodes]
+            hops += hop
+        successors_ok = sum(node.successor is self.nodes[(i + 1) % n_nodes] for i, node in enumerate(self.nodes))
+        fingers_ok = 0
+        for node in self.nodes:
+            for i, slot in enumerate(node.fingers):
+                ideal = self.nodes[bisect.bisect_left(self.ids, (node.id + (1 << i)) & self.mask) % n_nodes]
+                fingers_ok += slot == ideal.slot
+        return {
+            "lookups_ok": correct / len(key_ids) if key_ids else 1.0,
+            "avg_hops": hops / len(key_ids) if key_ids else 0.0,
+            "successors_ok": successors_ok / n_nodes,
+            "fingers_ok": fingers_ok / (n_nodes * self.m_bits),
+        }
+
+    def load_report(self) -> Dict[str, Any]:
+        #how evenly the work is spread over the physical nodes: keys each one owns (what its queries are routed to),
+        #keys it stores with the replicas counted, and the share of the hash space its tokens cover
+        owned: Dict[Any, int] = {}
+        stored: Dict[Any, int] = {}
+        share: Dict[Any, float] = {}
+        n_nodes = len(self.nodes)
+        for i, node in enumerate(self.nodes):
+            host = node.host if node.host is not None else node.id
+            stored[host] = stored.get(host, 0) + len(node.load()) #maps a snapshot segment in, key_ids with it
+            owned[host] = owned.get(host, 0) + len(node.key_ids)
+            arc = (node.id - self.nodes[i - 1].id) & self.mask if n_nodes > 1 else self.M #the arc (pred, node] it owns
+            share[host] = share.get(host, 0.0) + arc / self.M
+        return {
+            "hosts": len(owned),
+            "tokens": n_nodes,
+            "owned": load_stats(list(owned.values())),
+            "stored": load_stats(list(stored.values())),
+            "share": load_stats(list(share.values())),
+            "per_host": {host: {"owned": owned[host], "stored": stored[host], "share": share[host]} for host in owned},
+        }
+
+    def converge(self, max_rounds: int = 100, fingers_per_round: int = 1, probes: int = 256,
+                 seed: int = 0, wait_for_fingers: bool = False) -> List[Dict[str, float]]:
+        #runs stabilize rounds until every probe lookup and every successor pointer (and, if asked, every finger)
+        #is right again. returns the ring health before the first round and after each one
+        rng = random.Random(seed)
+        key_ids = [rng.getrandbits(self.m_bits) for _ in range(probes)]
+        history = [dict(self.ring_health(key_ids), round=0)]
+        for rnd in range(1, max_rounds + 1):
+            self.stabilize_round(fingers_per_round)
+            stats = dict(self.ring_health(key_ids), round=rnd)
+            history.append(stats)
+            if stats["lookups_ok"] == 1.0 and stats["successors_ok"] == 1.0 and \
+                    (not wait_for_fingers or stats["fingers_ok"] == 1.0):
+                break
+        return history
 
     def put(self, key: str, value: Any, r: int) -> Node:
         h = self._hash_key(key) #hash the movie tile, title = key
         owner, _ = self.find_successor(h) #find where the key should be hosted
         if key not in owner.data:
-            owner.data[key] = [] 
-        owner.data[key].append(value) #insert the key and the values to the correct node
-        half_ring = 1 << (self.m_bits - 1) #find the opposite position of that node
-        opposite_id = (owner.id + half_ring) & self.mask 
-        current, _ = self.find_successor(opposite_id) 
-        for _ in range(r):
-            current.data[key] = list(owner.data[key]) #insert the data (as backup) to the opposite node and his 'r' successors 
-            current = current.successor
+            owner.index_keys([(h, key)])
+        owner.data.append(key, value) #insert the key and the values to the correct node
+        for replica in self._replica_nodes(owner, r): #the opposite node and his 'r' successors keep a backup
+            replica.data.append(key, value) #only the new value is appended, the owner's rows are not copied again
         return owner
 
+    def put_many(self, pairs: Iterable[Tuple[str, Any]], r: int) -> None:
+        pairs = list(pairs)
+        if not pairs or not self.nodes:
+            return
+        with _gc_paused():
+            self._put_many(pairs, r)
+
+    def _put_many(self, pairs: List[Tuple[str, Any]], r: int) -> None:
+        hashes = self._hash_keys([key for key, _ in pairs]) #hash and place the whole batch
+        self.merge_partitions(_group(pairs, hashes, self._owner_indices(hashes)), r)
+
+    def merge_partitions(self, parts: Dict[int, Tuple[ColumnStore, List[int], List[str]]], r: int) -> None:
+        #ring position of the owner -> (its new rows, hash and key of every key in there), as built by partition_pairs.
+        #the rows are appended column by column to the owner and to its replicas, whose placement only depends on the owner
+        for pos, (rows, key_ids, keys) in parts.items():
+            owner = self.nodes[pos]
+            for replica in self._replica_nodes(owner, r):
+                replica.data.merge(rows)
+            data = owner.data
+            seen = data.keys() & keys if data else None
+            if seen: #only the keys the owner did not have yet go into its index
+                new = [i for i, key in enumerate(keys) if key not in seen]
+                key_ids, keys = [key_ids[i] for i in new], [keys[i] for i in new]
+            data.merge(rows)
+            owner.index_columns(key_ids, keys)
+
+    def put_many_parallel(self, batches: Iterable[Any], r: int, convert: Optional[Callable[[Any], List[Tuple[str, Any]]]] = None,
+                          workers: Optional[int] = None) -> None:
+        #worker processes hash, place and group the batches (convert turns a raw batch, e.g. a DataFrame chunk, into pairs
+        #first) against a copy of the ring ids; the parent only merges one partition per owner (and copies it to the
+        #owner's replicas, whose placement it already caches). Batches are merged in the order given
+        if not self.nodes:
+            return
+        workers = workers or os.cpu_count() or 1
+        ids, epoch = list(self.ids), self.epoch
+        pending: Deque[Future] = deque()
+
+        def merge_oldest() -> None:
+            parts = pending.popleft().result()
+            if self.epoch != epoch:
+                raise RuntimeError("the ring changed while a parallel insert was running")
+            self.merge_partitions(parts, r)
+
+        with ProcessPoolExecutor(max_workers=workers) as pool, _gc_paused():
+            for batch in batches:
+                pending.append(pool.submit(partition_pairs, ids, self.m_bits, batch, convert))
+                if len(pending) > 2 * workers: #bounded read-ahead, workers stay busy while the parent merges
+                    merge_oldest()
+            while pending:
+                merge_oldest()
+
     def get(self, key: str) -> List[Any]:
         h = self._hash_key(key) #hash the query
-        owner, hops = self.find_successor(h) #find to which node the query should be if exists
+        owner = self.cache.get(h, self.epoch) if self.cache is not None else None
+        if owner is not None:
+            hops = 1 #the owner is already known, the query goes straight to it
+        else:
+            owner, hops = self.find_successor(h) #find to which node the query should be if exists
+            if self.cache is not None:
+                self.cache.put(h, owner, self.epoch)
         results = owner.data.get(key, []) #check the node for the key = query
         if len(results) == 0: #if it doesnt exists it maybe due to a node failure so check for backups
+            found = self._hedged_read(key, owner, hops)
+            if found is None: #checks if the query exists to the node opposite the key or its 'r' successors
+                half_ring = 1 << (self.m_bits - 1)
+                backup, extra_hops = self.find_successor((h + half_ring) & self.mask)
+                found = self._chain_read(key, backup, hops + extra_hops)
+            owner, results, hops = found
+        return [(key, owner, results, hops)]
+
+    def _chain_read(self, key: str, node: Node, hops: int) -> Tuple[Node, List[Any], int]:
+        if key in node.data:
+            return node, node.data[key], hops
+        for succ in node.successors: #one more hop, the whole successor list is asked at once
+            if succ.alive and key in succ.data: #crashed nodes stay in the lists until stabilize drops them
+                return succ, succ.data[key], hops + 1
+        return node, [], hops + 1
+
+    def _hedged_read(self, key: str, owner: Node, hops: int) -> Optional[Tuple[Node, List[Any], int]]:
+        # the owner missed the key, so its successor list and the opposite replica chain are asked at the same time
+        # and the answer with the fewest hops wins. The owner's last finger is successor(owner + 2^(m-1)), the node
+        # put starts the replica chain at, so it is one hop away; its successors (and its predecessor, in case the
+        # owner changed since the put) are one more
+        candidates = []
+        for node in owner.successors:
+            if node.alive and key in node.data:
+                candidates.append((hops + 1, node))
+                break
+        backup = owner.finger(self.m_bits - 1)
+        #a crashed finger not fixed yet (a snapshot saves it as the node itself) is skipped, get then looks the chain up
+        if backup is not None and backup is not owner and backup.alive:
+            if key in backup.data:
+                candidates.append((hops + 1, backup))
+            else:
+                for node in [backup.predecessor] + backup.successors:
+                    if node is not None and node.alive and key in node.data:
+                        candidates.append((hops + 2, node))
+                        break
+        if not candidates:
+            return None
+        best_hops, node = min(candidates, key=lambda c: c[0])
+        return node, node.data[key], best_hops
+
+    def get_many(self, keys: Iterable[str]) -> List[Tuple[str, Node, List[Any], int]]:
+        keys = list(keys)
+        if not self.nodes:
+            return [(key, None, [], 0) for key in keys]
+        with _gc_paused(): #every record dict built here outlives the call, like the rows of a bulk insert
+            return self._get_many(keys)
+
+    def _get_many(self, keys: List[str]) -> List[Tuple[str, Node, List[Any], int]]:
+        hashes = self._hash_keys(keys) #hash the whole batch
+        owners, hops = self._route_cached(hashes)
+        records: List[Any] = [None] * len(keys)
+        by_owner: Dict[int, List[int]] = {}
+        for i, owner in enumerate(owners):
+            by_owner.setdefault(owner.slot, []).append(i)
+        for slot, positions in by_owner.items(): #one store read per owner, its columns decoded once for all its keys
+            found = owners[positions[0]].data.get_many([keys[i] for i in positions], [])
+            for i, values in zip(positions, found):
+                records[i] = values
+        out = [(key, owner, values, h) for key, owner, values, h in zip(keys, owners, records, hops)]
+        missing = [i for i, values in enumerate(records) if len(values) == 0]
+        unresolved = []
+        for i in missing: #same fallback as get, the owner's successors and the opposite replica chain
+            found = self._hedged_read(keys[i], owners[i], hops[i])
+            if found is None:
+                unresolved.append(i)
+            else:
+                out[i] = (keys[i], *found)
+        if unresolved: #the rest are routed to the node opposite the key in one more batch
             half_ring = 1 << (self.m_bits - 1)
-            opposite_id = (h + half_ring) & self.mask
-            owner, extra_hops = self.find_successor(opposite_id)
-            hops += extra_hops
-            #checks if the query exists to any of the opposite node or its 'r' successors
-            results = owner.data.get(key, [])
-        return [(key, owner, results, hops)]
\ No newline at end of file
+            backups, extra_hops = self._route_many([(hashes[i] + half_ring) & self.mask for i in unresolved])
+            for i, backup, extra in zip(unresolved, backups, extra_hops):
+                out[i] = (keys[i], *self._chain_read(keys[i], backup, hops[i] + extra))
+        return out
+
+    def prefix_query(self, prefix: str, limit: Optional[int] = None, workers: int = 1) -> Iterator[Tuple[str, Node, List[Any]]]:
+        #every node answers from its own sorted key index and the answers stream out merged in key order, a key whose
+        #replicas sit on several nodes comes out once. limit stops after that many keys (autocomplete)
+        return scatter_gather(self.nodes, lambda node: node.data.key_prefix(prefix, limit), _fetch, limit, workers)
+
+    def range_query(self, lo: str, hi: Optional[str] = None, limit: Optional[int] = None,
+                    workers: int = 1) -> Iterator[Tuple[str, Node, List[Any]]]:
+        #same as prefix_query for the keys in [lo, hi)
+        return scatter_gather(self.nodes, lambda node: node.data.key_range(lo, hi, limit), _fetch, limit, workers)
+
+
+
+def _fetch(node: Node, key: str) -> List[Any]:
+    return node.data.get(key, [])
+
+
+def gini(values: List[float]) -> float:
+    #0 when every node carries the same load, close to 1 when one node carries all of it
+    n, total = len(values), sum(values)
+    if n == 0 or total == 0:
+        return 0.0
+    weighted = sum(i * v for i, v in enumerate(sorted(values), 1))
+    return 2 * weighted / (n * total) - (n + 1) / n
+
+
+def load_stats(values: List[float]) -> Dict[str, float]:
+    mean = sum(values) / len(values) if values else 0.0
+    return {
+        "mean": mean,
+        "min": min(values, default=0),
+        "max": max(values, default=0),
+        "max_mean": max(values) / mean if mean else 0.0,
+        "gini": gini(values),
+    }
+
+
+@contextmanager
+def _gc_paused() -> Iterator[None]:
+    #a bulk insert allocates millions of lists and dicts that all stay alive, so the cyclic collector would keep
+    #rescanning a growing heap without ever freeing anything. It is switched off for the batch and restored after
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if was_enabled:
+            gc.enable()
+
+
+def partition_pairs(ids: List[int], m_bits: int, batch: Any,
+                    convert: Optional[Callable[[Any], List[Tuple[str, Any]]]] = None) -> Dict[int, Tuple[ColumnStore, List[int], List[str]]]:
+    #only the sorted node ids are needed to hash the keys, find their owners and store the values per owner column-wise,
+    #so this runs just as well in a worker process. Returns ring position -> (rows, hash per distinct key, key)
+    with _gc_paused():
+        return _partition(ids, m_bits, list(convert(batch) if convert is not None else batch))
+
+
+def _partition(ids: List[int], m_bits: int, pairs: List[Tuple[str, Any]]) -> Dict[int, Tuple[ColumnStore, List[int], List[str]]]:
+    mask = (1 << m_bits) - 1
+    n_nodes = len(ids)
+    hashes = [xxhash.xxh64_intdigest(str(key)) & mask for key, _ in pairs]
+    if np is not None:
+        owner_idx = (np.searchsorted(np.array(ids, dtype=np.uint64), np.array(hashes, dtype=np.uint64)) % n_nodes).tolist()
+    else:
+        owner_idx = [bisect.bisect_left(ids, h) % n_nodes for h in hashes]
+    return _group(pairs, hashes, owner_idx)
+
+
+def _group(pairs: List[Tuple[str, Any]], hashes: List[int], owner_idx: List[int]) -> Dict[int, Tuple[ColumnStore, List[int], List[str]]]:
+    #the pairs of every owner become one column store, with the hash and key of each distinct key next to it
+    groups: Dict[int, Tuple[List[str], List[Any], Dict[str, int]]] = {}
+    for (key, value), h, o in zip(pairs, hashes, owner_idx):
+        group = groups.get(o)
+        if group is None:
+            groups[o] = group = ([], [], {})
+        group[0].append(key)
+        group[1].append(value)
+        group[2].setdefault(key, h)
+    parts: Dict[int, Tuple[ColumnStore, List[int], List[str]]] = {}
+    for o, (keys, values, distinct) in groups.items():
+        rows = ColumnStore()
+        rows.append_rows(keys, values)
+        parts[o] = (rows, list(distinct.values()), list(distinct))
+    return parts
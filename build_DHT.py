@@ -1,69 +1,46 @@
-from concurrent.futures import ProcessPoolExecutor
-import pandas as pd
 import time
 from DHT import DHT
-import pickle
+from churn import even_schedule, load_queries, print_steps, run_churn, write_json
+from snapshot import save_snapshot, load_snapshot
+from src.common.ingest import stream, key_value_records
 import csv
 import os
 import random
 
 
 CSV_PATH = r"C:/Users/tasis/Desktop/sxoli/DISTRIBUTED_SYSTEMS/output.csv" #where the dataset is stored
-PICKLE_PATH = r"C:/Users/tasis/Desktop/sxoli/DISTRIBUTED_SYSTEMS/my_dht.pkl"
+SNAPSHOT_PATH = r"C:/Users/tasis/Desktop/sxoli/DISTRIBUTED_SYSTEMS/my_dht.snap"
+LOOKUP_PATH = r"C:/Users/tasis/Desktop/sxoli/DISTRIBUTED_SYSTEMS/random_movie_names.csv" #titles saved by find_random_movies
+CHURN_PATH = r"C:/Users/tasis/Desktop/sxoli/DISTRIBUTED_SYSTEMS/churn.json" #hops, success rate and latency per deletion step
 replication_factor = 3
+vnodes = 1 #ring positions per physical node, 16 spreads the keys so the busiest node holds ~1.5x the mean instead of ~6x
+MOVIE_COLUMNS = ["id", "release_date", "title"] #the only columns kept per movie, the rest are not even parsed
 
-def make_chunks(n_rows: int, batch_size: int): #function to split the data into batches
-    chunks = []
-    for start in range(0, n_rows, batch_size):
-        end = min(start + batch_size, n_rows)
-        chunks.append((start, end))
-    return chunks
-
-def process_chunk(start: int, end: int):
-    df = pd.read_csv(CSV_PATH, skiprows=range(1, start + 1), nrows=end - start)
-    out = []
-    for _, row in df.iterrows():
-        filtered_data = {
-            "id": row.get("id"),
-            "release_date": row.get("release_date"),
-            "title": row.get("title")
-        }
-        out.append((row["title"], filtered_data))
-    return out
+def movie_records(df):
+    return key_value_records(df, "title", MOVIE_COLUMNS) #(title, movie) pairs, column-wise instead of iterrows
 
 if __name__ == "__main__":
     d = None
-    if os.path.exists(PICKLE_PATH):
-        print("Loading existing DHT from pickle...")
-        with open(PICKLE_PATH, "rb") as f:
-            d = pickle.load(f)
+    if os.path.exists(SNAPSHOT_PATH):
+        print("Loading existing DHT from snapshot...")
+        d = load_snapshot(SNAPSHOT_PATH) #only the ring is read here, node data is mapped in on first use
     else:
-        print("No .pkl file found. Building new DHT...")
-        df_info = pd.read_csv(CSV_PATH, usecols=["title"])
-        n_rows = len(df_info)
-        batch_size = 50000 #how big the batch size is. e.g. if its 50000 it means that data is split into chunks of 50000 rows
-
-        chunks = make_chunks(n_rows, batch_size) #create the chuncks
-        d = DHT(m_bits=64) # create the dht table
-        
-        for i in range(300):
-            d.join(f"node{i}") #create 300 nodes
+        print("No snapshot found. Building new DHT...")
+        batch_size = 50000 #how big the batch size is. e.g. if its 50000 it means that data is read in chunks of 50000 rows
+        d = DHT.from_node_names((f"node{i}" for i in range(300)), m_bits=64, vnodes=vnodes) # create the dht table with 300 nodes
 
         start_time = time.perf_counter()
-        
-        with ProcessPoolExecutor(max_workers=os.cpu_count()) as ex:
-            futures = [ex.submit(process_chunk, s, e) for (s, e) in chunks]
-            for fut in futures:
-                pairs = fut.result()
-                for title, attrs in pairs:
-                    d.put(title, attrs, replication_factor) #insert the title as a key and the rest of the data concurently with the help of ProccessPoolExecutor
-
-        with open(PICKLE_PATH, "wb") as f:
-            pickle.dump(d, f) #save the data into a .pkl file
-
-            # .pkl files are used to store a state of our code. something like a cell in Jupyter Notebook. this way
-            #we dont have to rebuild the DHT everytime we need to test something wasting around 25 sec
-            
+
+        #one pass over the file: a reader thread parses the chunks, worker processes hash and partition them by owner
+        #and this process only merges each node's partition
+        chunks = stream(CSV_PATH, chunksize=batch_size, usecols=MOVIE_COLUMNS)
+        d.put_many_parallel(chunks, replication_factor, convert=movie_records)
+
+        save_snapshot(d, SNAPSHOT_PATH) #save the ring and the data into a snapshot file
+
+        # the snapshot stores a state of our code. something like a cell in Jupyter Notebook. this way
+        #we dont have to rebuild the DHT everytime we need to test something wasting around 25 sec
+
         print(f"Build completed in {time.perf_counter() - start_time:.2f} seconds.")
 
 
@@ -114,7 +91,7 @@ if __name__ == "__main__":
                 results.append([movie.get("title")])
 
         with open(
-            "C:/Users/tasis/Desktop/sxoli/DISTRIBUTED_SYSTEMS/random_movie_names.csv",
+            LOOKUP_PATH,
             "w",
             newline="",
             encoding="utf-8"
@@ -125,8 +102,8 @@ if __name__ == "__main__":
 
     def node_keys_len():
         results = []
-        for node in d.nodes:
-            results.append([len(node.data)])
+        for tokens in d.hosts.values(): #per physical node, summed over its tokens
+            results.append([sum(len(node.data) for node in tokens)])
         with open('C:/Users/tasis/Desktop/sxoli/DISTRIBUTED_SYSTEMS/movies_len_in_each_node_with_r_3.csv', 'w', newline='', encoding='utf-8') as csvfile:
             writer = csv.writer(csvfile)
             writer.writerows(results)
@@ -141,25 +118,11 @@ if __name__ == "__main__":
             writer.writerows(results)
 
     def deletion(number: int, step: int):
-        with open('C:/Users/tasis/Desktop/sxoli/DISTRIBUTED_SYSTEMS/nodes.csv', newline='', encoding='utf-8') as f:
-            temp_number = number
-            rows = list(csv.reader(f))
-            while temp_number>0:
-                for i in range(step):
-                    r = random.randrange(len(rows))
-                    d.leave(next((n for n in d.nodes if n.id == int(rows[r][0])), None))
-                    del rows[r]
-                    with open('C:/Users/tasis/Desktop/sxoli/DISTRIBUTED_SYSTEMS/random_movie_names.csv', newline='', encoding='utf-8') as c:
-                        result_count = 0
-                        hops = 0
-                        reader_c = csv.reader(c)
-                        for row in reader_c:
-                            key, owner, movie_list, hop = d.get(row[0])[0]
-                            hops = hops + hop
-                temp_number = temp_number - step
-                print("For", f"{(number - temp_number)/3:.2f}", "%",  " failed nodes and a replication factor of ", replication_factor, "we had avergae hops of:", f"{hops/29912:.2f}")
-
-
+        #removes number physical nodes, step at a time, and runs the saved lookups after every step (see churn.py)
+        queries = load_queries(LOOKUP_PATH) #read once, not after every removal
+        result = run_churn(d, queries, even_schedule(number, step))
+        print_steps(result["steps"])
+        write_json(result, CHURN_PATH)
 
 
     #save_nodes() # save all the node hashes in acsv file for further testing
@@ -0,0 +1,162 @@
+import csv
+import json
+import random
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from DHT import DHT
+from node import Node
+
+NUM_NODES = 300
+NUM_KEYS = 100_000
+NUM_QUERIES = 10_000
+LATENCY_SAMPLE = 500 #single gets timed per step for the latency distribution, the full query set goes through get_many
+replication_factor = 3
+
+Schedule = List[Tuple[int, int]] #(physical nodes removed, physical nodes joined) for every step
+
+
+def even_schedule(total: int, step: int, joins: int = 0) -> Schedule:
+    #total removals, step at a time, with the same number of joins after each step
+    return [(min(step, total - done), joins) for done in range(0, total, step)]
+
+
+def load_queries(path: str, limit: Optional[int] = None) -> List[str]:
+    #first column of a csv such as random_movie_names.csv, read once for the whole run
+    with open(path, newline="", encoding="utf-8") as f:
+        queries = [row[0] for row in csv.reader(f) if row]
+    return queries[:limit] if limit is not None else queries
+
+
+def sample_queries(d: DHT, n: int, seed: int = 0) -> List[str]:
+    #keys stored in the ring right now, so every miss after churn is a key the ring lost
+    keys: List[str] = []
+    for node in d.nodes:
+        node.load() #maps a snapshot segment in, key_names with it
+        keys.extend(node.key_names)
+    return random.Random(seed).sample(keys, min(n, len(keys)))
+
+
+def distribution(values: Sequence[float]) -> Dict[str, float]:
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+    n = len(ordered)
+    return {
+        "count": n,
+        "mean": sum(ordered) / n,
+        "p50": ordered[n // 2],
+        "p90": ordered[min(n - 1, n * 90 // 100)],
+        "p99": ordered[min(n - 1, n * 99 // 100)],
+        "max": ordered[-1],
+    }
+
+
+def measure(d: DHT, queries: List[str], latency_sample: int = LATENCY_SAMPLE, seed: int = 0) -> Dict[str, Any]:
+    #hops and success rate over the whole query set in one get_many, latency over single gets of a sample of it
+    start = time.perf_counter()
+    results = d.get_many(queries)
+    elapsed = time.perf_counter() - start
+    hops = [h for *_, h in results]
+    found = sum(1 for _, _, records, _ in results if records)
+    latencies = []
+    for key in random.Random(seed).sample(queries, min(latency_sample, len(queries))):
+        t0 = time.perf_counter()
+        d.get(key)
+        latencies.append(1e6 * (time.perf_counter() - t0))
+    return {
+        "success_rate": found / len(queries) if queries else 1.0,
+        "hops": distribution(hops),
+        "hop_histogram": {str(h): c for h, c in sorted(Counter(hops).items())},
+        "latency_us": distribution(latencies),
+        "batch_lookups_per_s": len(queries) / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def run_churn(d: DHT, queries: List[str], schedule: Schedule, mode: str = "leave", stabilize_rounds: int = 0,
+              victims: Optional[List[int]] = None, latency_sample: int = LATENCY_SAMPLE, seed: int = 0) -> Dict[str, Any]:
+    #mode "leave": nodes go away with DHT.leave and come in with DHT.join, the ring is repaired on the spot.
+    #mode "fail": nodes crash (DHT.fail) and join lazily, then stabilize_rounds rounds of the protocol run before
+    #the lookups (needs a DHT built with array_ring=False).
+    #victims are node ids to remove in that order (e.g. read from nodes.csv), otherwise whole physical nodes are
+    #picked at random. Nodes joined during the run are never removed
+    if mode not in ("leave", "fail"):
+        raise ValueError(f"unknown churn mode {mode}")
+    rng = random.Random(seed)
+    if victims is None:
+        names = sorted(d.hosts)
+        rng.shuffle(names)
+        targets: List[List[Node]] = [list(d.hosts[name]) for name in names]
+    else:
+        by_id = {node.id: node for node in d.nodes} #id -> node, built once instead of a scan per removal
+        targets = [[by_id[node_id]] for node_id in victims]
+    initial = len(targets)
+    removed = joined = serial = 0
+    start = time.perf_counter()
+    steps = [dict(step=0, removed=0, joined=0, removed_pct=0.0, hosts=len(d.hosts), tokens=len(d.nodes),
+                  **measure(d, queries, latency_sample, seed))]
+    for i, (n_remove, n_join) in enumerate(schedule, 1):
+        for tokens in targets[removed:removed + n_remove]:
+            for node in tokens:
+                if mode == "leave":
+                    d.leave(node)
+                else:
+                    d.fail(node)
+        removed = min(initial, removed + n_remove)
+        for _ in range(n_join):
+            while f"churn node{seed}-{serial}" in d.hosts: #left over from an earlier run on the same ring
+                serial += 1
+            name = f"churn node{seed}-{serial}"
+            if mode == "leave":
+                d.join(name)
+            else:
+                d.join_lazy(name)
+            joined += 1
+        if mode == "fail":
+            for _ in range(stabilize_rounds):
+                d.stabilize_round()
+        steps.append(dict(step=i, removed=removed, joined=joined, removed_pct=100 * removed / initial if initial else 0.0,
+                          hosts=len(d.hosts), tokens=len(d.nodes), **measure(d, queries, latency_sample, seed + i)))
+    return {
+        "mode": mode,
+        "stabilize_rounds": stabilize_rounds,
+        "queries": len(queries),
+        "seed": seed,
+        "seconds": time.perf_counter() - start,
+        "steps": steps,
+    }
+
+
+def print_steps(steps: List[Dict[str, Any]]) -> None:
+    print(f"{'step':>4}{'removed':>9}{'joined':>8}{'success':>10}{'avg hops':>10}{'p99 hops':>10}"
+          f"{'p50 us':>9}{'p99 us':>9}")
+    for s in steps:
+        print(f"{s['step']:>4}{s['removed_pct']:>8.1f}%{s['joined']:>8}{s['success_rate']:>10.2%}{s['hops']['mean']:>10.2f}"
+              f"{s['hops']['p99']:>10}{s['latency_us']['p50']:>9.1f}{s['latency_us']['p99']:>9.1f}")
+
+
+def write_json(result: Any, path: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+
+
+def report(path: str = "churn.json", num_nodes: int = NUM_NODES, num_keys: int = NUM_KEYS) -> None:
+    #half of the physical nodes removed, 10 at a time: graceful leaves, then crashes with and without joins
+    #repaired by two stabilize rounds per step
+    names = [f"node{i}" for i in range(num_nodes)]
+    pairs = [(f"movie {i}", {"id": i}) for i in range(num_keys)]
+    runs = {}
+    for label, mode, joins in (("leave", "leave", 0), ("fail", "fail", 0), ("fail+join", "fail", 5)):
+        d = DHT.from_node_names(names, m_bits=64)
+        d.put_many(pairs, replication_factor)
+        queries = sample_queries(d, NUM_QUERIES)
+        runs[label] = run_churn(d, queries, even_schedule(num_nodes // 2, 10, joins), mode=mode, stabilize_rounds=2)
+        print(f"\n{label}: {num_nodes} nodes, {num_keys} keys, r={replication_factor}, "
+              f"{len(queries)} queries per step, {runs[label]['seconds']:.2f} s")
+        print_steps(runs[label]["steps"])
+    write_json(runs, path)
+
+
+if __name__ == "__main__":
+    report()
@@ -0,0 +1,39 @@
+import random
+from typing import Dict, List
+
+from DHT import DHT
+
+NUM_NODES = 300
+NUM_KEYS = 20_000
+
+
+def churn_burst(d: DHT, joins: int, failures: int, seed: int = 0) -> None:
+    #a burst of lazy joins and crashes with no stabilization in between
+    rng = random.Random(seed)
+    for node in rng.sample(d.nodes, failures):
+        d.fail(node)
+    for i in range(joins):
+        d.join_lazy(f"late node{seed}-{i}")
+
+
+def print_history(history: List[Dict[str, float]]) -> None:
+    print(f"{'round':>5}{'lookups ok':>12}{'avg hops':>10}{'succ ok':>10}{'fingers ok':>12}")
+    for stats in history:
+        print(f"{stats['round']:>5}{stats['lookups_ok']:>12.1%}{stats['avg_hops']:>10.2f}"
+              f"{stats['successors_ok']:>10.1%}{stats['fingers_ok']:>12.1%}")
+
+
+def report(num_nodes: int = NUM_NODES, fingers_per_round: int = 4) -> None:
+    for joins, failures in ((30, 0), (0, 30), (30, 30)):
+        d = DHT.from_node_names([f"node{i}" for i in range(num_nodes)], m_bits=64)
+        d.put_many(((f"movie {i}", {"id": i}) for i in range(NUM_KEYS)), 1)
+        churn_burst(d, joins, failures)
+        history = d.converge(max_rounds=200, fingers_per_round=fingers_per_round, wait_for_fingers=True)
+        lookups_done = next(s["round"] for s in history if s["lookups_ok"] == 1.0 and s["successors_ok"] == 1.0)
+        print(f"\n{num_nodes} nodes, {joins} joins + {failures} failures, {fingers_per_round} fingers fixed per node per round: "
+              f"lookups correct after {lookups_done} rounds, fingers after {history[-1]['round']}")
+        print_history(history)
+
+
+if __name__ == "__main__":
+    report()
@@ -0,0 +1,34 @@
+import time
+from typing import Any, Dict
+
+from DHT import DHT
+
+NUM_NODES = 300
+NUM_KEYS = 200_000
+replication_factor = 3
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"{report['hosts']} physical nodes, {report['tokens']} tokens")
+    print(f"{'':16}{'mean':>12}{'max':>12}{'max/mean':>10}{'gini':>8}")
+    for name, label in (("owned", "keys owned"), ("stored", "keys stored"), ("share", "hash space")):
+        stats = report[name]
+        fmt = ".4f" if name == "share" else ".0f"
+        print(f"{label:16}{stats['mean']:>12{fmt}}{stats['max']:>12{fmt}}{stats['max_mean']:>10.2f}{stats['gini']:>8.3f}")
+
+
+def report(num_nodes: int = NUM_NODES, num_keys: int = NUM_KEYS) -> None:
+    #the same keys on the same physical nodes, with more and more tokens per node
+    names = [f"node{i}" for i in range(num_nodes)]
+    pairs = [(f"movie {i}", {"id": i, "title": f"movie {i}"}) for i in range(num_keys)]
+    for vnodes in (1, 4, 16, 64):
+        start = time.perf_counter()
+        d = DHT.from_node_names(names, m_bits=64, array_ring=True, vnodes=vnodes)
+        built = time.perf_counter() - start
+        d.put_many(pairs, replication_factor)
+        print(f"\nvnodes={vnodes} (ring built in {built:.2f} s)")
+        print_report(d.load_report())
+
+
+if __name__ == "__main__":
+    report()
@@ -0,0 +1,115 @@
+import gc
+import pickle
+import sys
+import time
+import tracemalloc
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+
+from DHT import DHT
+from node import Node
+
+NUM_NODES = 300
+NUM_KEYS = 1_000_000
+replication_factor = 3
+
+
+class LegacyNode:
+    #the node layout before __slots__: a __dict__ per node, fingers as a list of node references and a data dict
+    #from the start. It carries the same pointers as Node (successor list and host included), so only the layout differs
+    def __init__(self, node_id: int, m_bits: int):
+        self.id: int = node_id
+        self.successor: "LegacyNode" = self
+        self.predecessor: Optional["LegacyNode"] = None
+        self.successors: List["LegacyNode"] = []
+        self.fingers: List["LegacyNode"] = [self] * m_bits
+        self.data: Dict[str, List[Any]] = {}
+        self.host: Optional[str] = None
+
+
+def legacy_copy(d: DHT) -> List[LegacyNode]:
+    #same ring, same fingers, only the node representation differs
+    nodes = [LegacyNode(n.id, d.m_bits) for n in d.nodes]
+    by_slot = {n.slot: legacy for n, legacy in zip(d.nodes, nodes)}
+    for n, legacy in zip(d.nodes, nodes):
+        legacy.successor = by_slot[n.successor.slot]
+        legacy.predecessor = by_slot[n.predecessor.slot]
+        legacy.successors = [by_slot[s.slot] for s in n.successors]
+        legacy.fingers = [by_slot[s] for s in n.fingers]
+        legacy.host = n.host
+    return nodes
+
+
+def compact_copy(d: DHT) -> List[Node]:
+    #the same ring as Node objects in a fresh table, built and measured exactly like legacy_copy. The DHT's own
+    #bookkeeping (sorted ids, hosts) is the same for both layouts and left out of the comparison
+    table: List[Optional[Node]] = []
+    nodes = [Node(n.id, d.m_bits, table) for n in d.nodes]
+    pos_of = {n.slot: i for i, n in enumerate(d.nodes)}
+    for n, compact in zip(d.nodes, nodes):
+        compact.successor = nodes[pos_of[n.successor.slot]]
+        compact.predecessor = nodes[pos_of[n.predecessor.slot]]
+        compact.successors = [nodes[pos_of[s.slot]] for s in n.successors]
+        compact.fingers = array("i", [pos_of[s] for s in n.fingers])
+        compact.host = n.host
+    return nodes
+
+
+def legacy_fill(d: DHT, legacy: List[LegacyNode], pairs: List[Tuple[str, Any]], r: int) -> None:
+    #the data layout before the column store: key -> list of value dicts, the replicas holding the owner's dicts
+    hashes = d._hash_keys([key for key, _ in pairs])
+    pos_of = {n.slot: i for i, n in enumerate(d.nodes)}
+    for (key, value), o in zip(pairs, d._owner_indices(hashes)):
+        owner = d.nodes[o]
+        for node in [owner, *d._replica_nodes(owner, r)]:
+            legacy[pos_of[node.slot]].data.setdefault(key, []).append(value)
+
+
+def movie_pairs(num_keys: int) -> List[Tuple[str, Any]]:
+    return [(f"movie {i}", {"id": i, "release_date": f"{1950 + i % 70}-01-{1 + i % 28:02d}", "title": f"movie {i}"})
+            for i in range(num_keys)]
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    obj = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return obj, size
+
+
+def pickle_stats(obj):
+    start = time.perf_counter()
+    blob = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+    return len(blob), time.perf_counter() - start
+
+
+def report(num_nodes: int = NUM_NODES, num_keys: int = NUM_KEYS) -> None:
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 100000)) #the legacy graph pickles recursively
+
+    names = [f"node{i}" for i in range(num_nodes)]
+    d = DHT.from_node_names(names, m_bits=64)
+    _, compact_ring = measure(lambda: compact_copy(d))
+    legacy, legacy_ring = measure(lambda: legacy_copy(d))
+
+    _, data_size = measure(lambda: d.put_many(movie_pairs(num_keys), replication_factor)) #the pairs are garbage afterwards,
+    _, legacy_data = measure(lambda: legacy_fill(d, legacy, movie_pairs(num_keys), replication_factor)) #only what the nodes keep counts
+
+    compact_pickle, compact_time = pickle_stats(d.nodes)
+    legacy_pickle, legacy_time = pickle_stats(legacy)
+
+    mb = 1024 * 1024
+    print(f"{num_nodes} nodes, {num_keys} keys, replication factor {replication_factor}")
+    print("-" * 60)
+    print(f"{'':24}{'legacy':>16}{'compact':>16}")
+    print(f"{'ring (nodes+fingers)':24}{legacy_ring / 1024:>13.1f} KB{compact_ring / 1024:>13.1f} KB")
+    print(f"{'per node':24}{legacy_ring / num_nodes:>14.0f} B{compact_ring / num_nodes:>14.0f} B")
+    print(f"{'key/value data':24}{legacy_data / mb:>13.1f} MB{data_size / mb:>13.1f} MB")
+    print(f"{'total':24}{(legacy_ring + legacy_data) / mb:>13.1f} MB{(compact_ring + data_size) / mb:>13.1f} MB")
+    print(f"{'pickle size':24}{legacy_pickle / mb:>13.1f} MB{compact_pickle / mb:>13.1f} MB")
+    print(f"{'pickle time':24}{legacy_time:>14.2f} s{compact_time:>14.2f} s")
+
+
+if __name__ == "__main__":
+    report()
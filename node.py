@@ -1,4 +1,8 @@
-from typing import Optional, List, Dict, Any
+import bisect
+from array import array
+from typing import Optional, List, Any, Tuple
+
+from src.common.column_store import ColumnStore
 
 #function to check if a number is between a space with the option for closed bracets
 def in_range(k: int, a: int, b: int, inclusive_right: bool = True) -> bool:
@@ -9,18 +13,150 @@ def in_range(k: int, a: int, b: int, inclusive_right: bool = True) -> bool:
     else:
         return k != a if inclusive_right else False
 
+class KeyIndex:
+    # hashes of the keys a node owns, sorted, so a range of them can be cut out, and the key for each of them.
+    # Big batches are appended as they come and sorted on first use (Node.sort_index)
+    __slots__ = ("ids", "names", "is_sorted")
+
+    def __init__(self, ids: Optional[List[int]] = None, names: Optional[List[str]] = None):
+        self.ids: List[int] = ids if ids is not None else []
+        self.names: List[str] = names if names is not None else []
+        self.is_sorted: bool = True
+
+
 class Node:
-    def __init__(self, node_id: int, m_bits: int):
+    # no per-instance __dict__, a ring of thousands of nodes pickles and sits in memory much smaller. Only the ring
+    # pointers live here, whatever a node needs for its keys is allocated when it first holds one
+    __slots__ = ("id", "successor", "predecessor", "successors", "table", "slot", "fingers", "_data", "_segment",
+                 "index", "ring", "host")
+
+    def __init__(self, node_id: int, m_bits: int, table: Optional[List[Optional["Node"]]] = None, slot: Optional[int] = None):
         self.id: int = node_id
         self.successor: "Node" = self  #node's successor
         self.predecessor: Optional["Node"] = None #nodes predecessor
-        self.fingers: List["Node"] = [self] * m_bits
-        self.data: Dict[str, List[Any]] = {}
+        self.successors: List["Node"] = [] #the next r nodes of the ring, successor first
+        self.table: List[Optional["Node"]] = table if table is not None else [] #node table shared by the whole ring
+        if slot is None:
+            slot = len(self.table)
+            self.table.append(self)
+        else: #a slot freed by a node that left (DHT._free_slots)
+            self.table[slot] = self
+        self.slot: int = slot #this node's index in the table, it never changes while the node lives
+        self.fingers = array("i", [self.slot]) * m_bits #finger i is stored as the table slot of the node, not a reference
+        self._data: Optional[ColumnStore] = None #key -> its records, stored column-wise, created on first use
+        self._segment = None #snapshot segment the data is loaded from on first access (see snapshot.py)
+        self.index: Optional[KeyIndex] = None #the keys this node owns by hash, created with the store
+        self.ring = None #array-backed ring (ring.ArrayRing) the node routes on, if the DHT uses one
+        self.host: Optional[str] = None #name of the physical node this ring position (token) belongs to
+
+    def load(self) -> ColumnStore:
+        #the store and the key index come into existence together: mapped in from the snapshot segment the node was
+        #restored from, or empty, since a bare ring node carries neither until it is first used
+        if self._data is None:
+            if self._segment is not None:
+                self._data, ids, names = self._segment.load()
+                self.index = KeyIndex(ids, names)
+                self._segment = None
+            else:
+                self._data, self.index = ColumnStore(), KeyIndex()
+        return self._data
+
+    @property
+    def key_ids(self) -> List[int]:
+        self.load()
+        return self.index.ids
+
+    @property
+    def key_names(self) -> List[str]:
+        self.load()
+        return self.index.names
+
+    @property
+    def data(self) -> ColumnStore:
+        return self.load()
+
+    @data.setter
+    def data(self, value: ColumnStore) -> None:
+        self._data = value
+        self._segment = None
+
+    def index_keys(self, entries: List[Tuple[int, str]]) -> None:
+        self.load() #the index is part of the snapshot segment too
+        index = self.index
+        if len(entries) <= 16 and index.is_sorted:
+            for key_id, key in entries:
+                pos = bisect.bisect_right(index.ids, key_id)
+                index.ids.insert(pos, key_id)
+                index.names.insert(pos, key)
+            return
+        self.index_columns([key_id for key_id, _ in entries], [key for _, key in entries])
+
+    def index_columns(self, key_ids: List[int], keys: List[str]) -> None:
+        #big batch, appended now and sorted once when the order is needed
+        self.load()
+        self.index.ids.extend(key_ids)
+        self.index.names.extend(keys)
+        self.index.is_sorted = False
+
+    def sort_index(self) -> None:
+        self.load()
+        index = self.index
+        if index.is_sorted:
+            return
+        ids, names = index.ids, index.names
+        order = sorted(range(len(ids)), key=ids.__getitem__)
+        index.ids = [ids[i] for i in order]
+        index.names = [names[i] for i in order]
+        index.is_sorted = True
+
+    def cut_range(self, lo: int, hi: int) -> Tuple[List[int], List[str]]:
+        #removes and returns the indexed keys whose hash falls in (lo, hi], still sorted
+        self.sort_index()
+        ids, names = self.index.ids, self.index.names
+        start = bisect.bisect_right(ids, lo)
+        end = bisect.bisect_right(ids, hi)
+        if lo < hi:
+            cut_ids, cut_names = ids[start:end], names[start:end]
+            del ids[start:end], names[start:end]
+        else: #the range wraps past 0
+            cut_ids, cut_names = ids[:end] + ids[start:], names[:end] + names[start:]
+            del ids[start:], names[start:]
+            del ids[:end], names[:end]
+        return cut_ids, cut_names
+
+    def hand_off(self, dst: "Node", lo: int) -> None:
+        #the indexed keys in (lo, dst] move to dst
+        moved_ids, moved_names = self.cut_range(lo, dst.id)
+        keys: List[str] = []
+        records: List[Any] = []
+        for key in moved_names:
+            values = self.data.pop(key)
+            keys.extend([key] * len(values))
+            records.extend(values)
+        dst.data.append_rows(keys, records)
+        dst.index_keys(list(zip(moved_ids, moved_names)))
+
+    def __getstate__(self):
+        if self._segment is not None: #never pickle a mapped segment, load it first
+            self.load()
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __setstate__(self, state) -> None:
+        for name, value in state.items():
+            setattr(self, name, value)
 
     def __repr__(self) -> str:
         return f"Node(id={self.id})"
 
+    def finger(self, i: int) -> "Node":
+        if self.ring is not None:
+            return self.ring.nodes[self.ring.fingers[self.ring.index_of(self.id), i]]
+        return self.table[self.fingers[i]]
+
     def find_successor(self, key_id: int):
+        if self.ring is not None:
+            idx, hops = self.ring.find_successor(self.ring.index_of(self.id), key_id)
+            return self.ring.nodes[idx], hops
         curr = self
         hops = 0
         while not in_range(key_id, curr.id, curr.successor.id, True):
@@ -29,10 +165,75 @@ class Node:
                 break
             curr = next_node
             hops += 1
-        return curr.successor, hops + 1
+        succ = curr.successor
+        if succ.table[succ.slot] is not succ: #failed and not repaired yet, the successor list takes over
+            succ = curr.live_successor()
+        return succ, hops + 1
 
     def closest_preceding_node(self, key_id: int) -> "Node":
-        for finger in reversed(self.fingers):
+        if self.ring is not None:
+            return self.ring.nodes[self.ring.closest_preceding(self.ring.index_of(self.id), key_id)]
+        table = self.table
+        for slot in reversed(self.fingers):
+            finger = table[slot]
             if finger is not None and in_range(finger.id, self.id, key_id, False):
                 return finger
-        return self
\ No newline at end of file
+        for succ in reversed(self.successors): #only reached while failed fingers are not fixed yet
+            if succ.table[succ.slot] is succ and in_range(succ.id, self.id, key_id, False):
+                return succ
+        return self
+
+    # -----------------------------
+    # Stabilization protocol
+    # -----------------------------
+    @property
+    def alive(self) -> bool:
+        return self.table[self.slot] is self #a failed node's slot is cleared (DHT.fail / DHT.leave)
+
+    def live_successor(self) -> "Node":
+        if self.successor.alive:
+            return self.successor
+        for succ in self.successors: #the successor failed, the first live entry of the list takes over
+            if succ.alive:
+                return succ
+        for slot in self.fingers: #the whole list failed too, fall back to the nearest live finger
+            finger = self.table[slot]
+            if finger is not None and finger is not self:
+                return finger
+        return self
+
+    def stabilize(self, r: int) -> None:
+        #ask the successor for its predecessor, adopt it if it sits between us, then tell the successor about us
+        succ = self.live_successor()
+        x = succ.predecessor
+        if x is not None and x is not self and x.alive and (succ is self or in_range(x.id, self.id, succ.id, False)):
+            succ = x
+        self.successor = succ
+        self.fingers[0] = succ.slot #finger 0 is the successor, lookups can always make progress through it
+        if succ is self:
+            self.successors = []
+            return
+        succ.notify(self)
+        self.successors = ([succ] + [s for s in succ.successors if s is not self and s.alive])[:r]
+
+    def notify(self, node: "Node") -> None:
+        #node thinks it might be our predecessor
+        pred = self.predecessor
+        if pred is None or pred is self or not pred.alive or in_range(node.id, pred.id, self.id, False):
+            self.predecessor = node
+            self.hand_off(node, self.id) #everything outside (node, self] is the new predecessor's, or further back
+
+    def check_predecessor(self) -> None:
+        if self.predecessor is not None and not self.predecessor.alive:
+            self.predecessor = None
+
+    def fix_fingers(self, start: int, count: int = 1) -> None:
+        #refreshes count fingers from start on, round robin (DHT.stabilize_round moves start along every round),
+        #so a round costs count lookups per node
+        m_bits = len(self.fingers)
+        mask = (1 << m_bits) - 1
+        for j in range(min(count, m_bits)):
+            i = (start + j) % m_bits
+            owner, _ = self.find_successor((self.id + (1 << i)) & mask)
+            if owner.alive:
+                self.fingers[i] = owner.slot
@@ -0,0 +1,190 @@
+import pickle
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import xxhash
+
+from DHT import DHT
+from node import Node, in_range
+from src.common.rpc import (KEY_ID, STEP_REPLY, Address, Cluster, ConnectionPool, RemoteRef, RpcError,
+                            pack_key_value, unpack_key_value)
+from src.common.scatter_gather import remote_scan, scan
+
+# ops a node server answers
+OP_STEP = 1 #KEY_ID -> STEP_REPLY (done, node id): the successor when done, otherwise the next node to ask
+OP_GET = 2 #utf-8 key -> pickled list of values
+OP_PUT = 3 #pack_key_value(key, pickled value) -> empty
+OP_SCAN = 4 #pickled scatter_gather.Scan -> pickled [(key, values)] in key order
+
+
+def detach(node: Node, m_bits: int) -> Node:
+    #copy of the node that can live in its own process: the other nodes it knows become RemoteRef stubs
+    local = Node(node.id, m_bits) #own table, the node itself is slot 0
+    slot_of: Dict[int, int] = {node.id: 0}
+    for i in range(m_bits):
+        finger_id = node.finger(i).id
+        if finger_id not in slot_of:
+            slot_of[finger_id] = len(local.table)
+            local.table.append(RemoteRef(finger_id))
+        local.fingers[i] = slot_of[finger_id]
+    if node.successor is not node:
+        local.successor = RemoteRef(node.successor.id)
+    if node.predecessor is not None and node.predecessor is not node:
+        local.predecessor = RemoteRef(node.predecessor.id)
+    local.successors = [RemoteRef(s.id) for s in node.successors]
+    node.sort_index()
+    local.data = node.data
+    local.index = node.index
+    return local
+
+
+class ChordHandler:
+    def __init__(self, node: Node, m_bits: int):
+        self.node = node
+        self.mask = (1 << m_bits) - 1
+
+    def handle(self, op: int, payload: bytes) -> bytes:
+        node = self.node
+        if op == OP_STEP:
+            (key_id,) = KEY_ID.unpack(payload)
+            if in_range(key_id, node.id, node.successor.id, True):
+                return STEP_REPLY.pack(1, node.successor.id)
+            next_node = node.closest_preceding_node(key_id)
+            if next_node is node:
+                return STEP_REPLY.pack(1, node.successor.id)
+            return STEP_REPLY.pack(0, next_node.id)
+        if op == OP_GET:
+            return pickle.dumps(node.data.get(payload.decode("utf-8"), []), protocol=pickle.HIGHEST_PROTOCOL)
+        if op == OP_PUT:
+            key, value = unpack_key_value(payload)
+            if key not in node.data:
+                node.index_keys([(xxhash.xxh64_intdigest(key) & self.mask, key)]) #same hash as DHT._hash_key
+            node.data.append(key, pickle.loads(value))
+            return b""
+        if op == OP_SCAN:
+            return pickle.dumps(scan(node.data, pickle.loads(payload)), protocol=pickle.HIGHEST_PROTOCOL)
+        raise ValueError(f"unknown op {op}")
+
+
+def serve_dht(d: DHT, base_port: int = 30000, processes: int = 4) -> Tuple[Cluster, Dict[int, Address]]:
+    #every node of the ring becomes a server on its own localhost port, spread over the worker processes
+    handlers = [ChordHandler(detach(node, d.m_bits), d.m_bits) for node in d.nodes]
+    cluster = Cluster(handlers, base_port=base_port, processes=processes)
+    return cluster, {node.id: address for node, address in zip(d.nodes, cluster.addresses())}
+
+
+class RemoteChord:
+    """Client side of a ring served by serve_dht: routes iteratively, one RPC per hop"""
+
+    def __init__(self, directory: Dict[int, Address], m_bits: int, pool: ConnectionPool = None):
+        self.directory = directory #node id -> address of its server
+        self.m_bits = m_bits
+        self.mask = (1 << m_bits) - 1
+        self.entry = min(directory) #same entry point as DHT.find_successor, the first node of the ring
+        self.pool = pool if pool is not None else ConnectionPool()
+
+    def _hash_key(self, key: str) -> int:
+        return xxhash.xxh64_intdigest(str(key)) & self.mask
+
+    def find_successor(self, key_id: int) -> Tuple[int, int]:
+        curr = self.entry
+        for hops in range(1, len(self.directory) + 1):
+            done, node_id = STEP_REPLY.unpack(self.pool.call(self.directory[curr], OP_STEP, KEY_ID.pack(key_id)))
+            if done:
+                return node_id, hops
+            curr = node_id
+        raise RpcError(f"lookup of {key_id} did not converge")
+
+    def find_successor_many(self, key_ids: List[int]) -> Tuple[List[int], List[int]]:
+        #all keys advance one hop per round; the keys waiting at the same node go to it as one pipelined batch
+        #and every node of the round gets its batch before any reply is read
+        owners = [0] * len(key_ids)
+        hops = [0] * len(key_ids)
+        at: Dict[int, List[int]] = {self.entry: list(range(len(key_ids)))} if key_ids else {}
+        for _ in range(len(self.directory)):
+            if not at:
+                return owners, hops
+            batches = {self.directory[node_id]: [(OP_STEP, KEY_ID.pack(key_ids[i])) for i in waiting]
+                       for node_id, waiting in at.items()}
+            replies = self.pool.scatter(batches)
+            next_at: Dict[int, List[int]] = {}
+            for node_id, waiting in at.items():
+                for i, reply in zip(waiting, replies[self.directory[node_id]]):
+                    done, next_id = STEP_REPLY.unpack(reply)
+                    hops[i] += 1
+                    if done:
+                        owners[i] = next_id
+                    else:
+                        next_at.setdefault(next_id, []).append(i)
+            at = next_at
+        if at:
+            raise RpcError(f"{sum(map(len, at.values()))} lookups did not converge")
+        return owners, hops
+
+    def get(self, key: str) -> List[Tuple[str, int, List[Any], int]]:
+        owner, hops = self.find_successor(self._hash_key(key))
+        results = pickle.loads(self.pool.call(self.directory[owner], OP_GET, key.encode("utf-8")))
+        return [(key, owner, results, hops)]
+
+    def get_many(self, keys: Iterable[str]) -> List[Tuple[str, int, List[Any], int]]:
+        keys = [str(key) for key in keys]
+        owners, hops = self.find_successor_many([self._hash_key(key) for key in keys])
+        by_owner: Dict[int, List[int]] = {}
+        for i, owner in enumerate(owners):
+            by_owner.setdefault(owner, []).append(i)
+        replies = self.pool.scatter({self.directory[owner]: [(OP_GET, keys[i].encode("utf-8")) for i in idx]
+                                     for owner, idx in by_owner.items()})
+        results: List[Any] = [None] * len(keys)
+        for owner, idx in by_owner.items():
+            for i, reply in zip(idx, replies[self.directory[owner]]):
+                results[i] = pickle.loads(reply)
+        return [(key, owner, res, h) for key, owner, res, h in zip(keys, owners, results, hops)]
+
+    def put(self, key: str, value: Any) -> int:
+        #owner only, the replicas of DHT.put are not kept by the node servers
+        owner, _ = self.find_successor(self._hash_key(key))
+        self.pool.call(self.directory[owner], OP_PUT,
+                       pack_key_value(str(key), pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)))
+        return owner
+
+    def put_many(self, pairs: Iterable[Tuple[str, Any]]) -> None:
+        pairs = [(str(key), value) for key, value in pairs]
+        owners, _ = self.find_successor_many([self._hash_key(key) for key, _ in pairs])
+        batches: Dict[Address, List[Tuple[int, bytes]]] = {}
+        for (key, value), owner in zip(pairs, owners):
+            batches.setdefault(self.directory[owner], []).append(
+                (OP_PUT, pack_key_value(key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))))
+        self.pool.scatter(batches)
+
+    def prefix_query(self, prefix: str, limit: Optional[int] = None) -> Iterator[Tuple[str, int, List[Any]]]:
+        #every node server searches its own index at the same time, see DHT.prefix_query
+        return remote_scan(self.pool, self.directory, OP_SCAN, ("prefix", prefix, None, limit))
+
+    def range_query(self, lo: str, hi: Optional[str] = None, limit: Optional[int] = None) -> Iterator[Tuple[str, int, List[Any]]]:
+        return remote_scan(self.pool, self.directory, OP_SCAN, ("range", lo, hi, limit))
+
+    def close(self) -> None:
+        self.pool.close()
+
+
+if __name__ == "__main__":
+    import time
+
+    d = DHT.from_node_names([f"node{i}" for i in range(64)], m_bits=64)
+    d.put_many(((f"movie {i}", {"id": i}) for i in range(20000)), r=1)
+    titles = [f"movie {i}" for i in range(0, 20000, 10)]
+
+    cluster, directory = serve_dht(d, processes=4)
+    with cluster:
+        client = RemoteChord(directory, d.m_bits)
+        t0 = time.perf_counter()
+        one_by_one = [client.get(title)[0] for title in titles]
+        t1 = time.perf_counter()
+        batched = client.get_many(titles)
+        t2 = time.perf_counter()
+        client.close()
+
+    assert [(k, o, h) for k, o, _, h in one_by_one] == [(k, o, h) for k, o, _, h in batched]
+    avg_hops = sum(h for *_, h in batched) / len(batched)
+    print(f"{len(titles)} gets over {len(directory)} node servers, avg hops {avg_hops:.2f}")
+    print(f"  one RPC at a time: {len(titles) / (t1 - t0):9.0f} gets/s")
+    print(f"  pipelined rounds:  {len(titles) / (t2 - t1):9.0f} gets/s")
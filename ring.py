@@ -0,0 +1,100 @@
+import bisect
+from typing import List, Tuple
+from node import Node, in_range
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, only the array-backed ring needs it
+    np = None
+
+
+class ArrayRing:
+    def __init__(self, nodes: List[Node], m_bits: int):
+        if np is None:
+            raise ImportError("the array-backed ring needs numpy")
+        self.nodes = list(nodes) #ring position -> node
+        self.m_bits = m_bits
+        self.mask = (1 << m_bits) - 1
+        n = len(self.nodes)
+        self._mask = np.uint64(self.mask)
+        self.ids = np.fromiter((node.id for node in self.nodes), dtype=np.uint64, count=n) #sorted node ids
+        self.id_list = self.ids.tolist() #plain ints for the scalar comparisons of the routing loop
+        offsets = np.left_shift(np.uint64(1), np.arange(m_bits, dtype=np.uint64))
+        starts = (self.ids[:, None] + offsets[None, :]) & self._mask #(N, m) finger starts, wrapping mod 2^m
+        self.fingers = (np.searchsorted(self.ids, starts, side="left") % max(n, 1)).astype(np.int32) #(N, m) finger indices
+
+        # clockwise distance from every node to each of its fingers. Along a row the distances never decrease,
+        # so "closest preceding finger" is just the count of fingers closer than the key.
+        # fingers that wrap back onto the node itself can never precede a key, they get the largest distance
+        self.finger_dist = (self.ids[self.fingers] - self.ids[:, None]) & self._mask
+        self.finger_dist[self.finger_dist == 0] = np.iinfo(np.uint64).max
+        # a single lookup only looks at one tiny row per hop, where a numpy call costs more than the whole search.
+        # The scalar path bisects plain-int copies of the rows instead; they are built on its first use, so a ring
+        # that only routes batches (route_many) never pays for them
+        self._dist_rows: List[List[int]] = []
+        self._finger_rows: List[List[int]] = []
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def _key_array(self, key_ids):
+        return np.fromiter(key_ids, dtype=np.uint64, count=len(key_ids))
+
+    def index_of(self, node_id: int) -> int:
+        #ring position of a node, looked up instead of stored on every node
+        return bisect.bisect_left(self.id_list, node_id)
+
+    def successor_index(self, key_ids):
+        #ring position of the node responsible for each key id, for a whole batch at once
+        return np.searchsorted(self.ids, self._key_array(key_ids), side="left") % len(self.nodes)
+
+    def _scalar_rows(self) -> Tuple[List[List[int]], List[List[int]]]:
+        if not self._dist_rows and len(self.nodes):
+            self._dist_rows = self.finger_dist.tolist()
+            self._finger_rows = self.fingers.tolist()
+        return self._dist_rows, self._finger_rows
+
+    def closest_preceding(self, idx: int, key_id: int) -> int:
+        dist_rows, finger_rows = self._scalar_rows()
+        t = bisect.bisect_left(dist_rows[idx], (key_id - self.id_list[idx]) & self.mask) #fingers closer than the key
+        if t == 0:
+            return idx
+        return finger_rows[idx][t - 1] #highest finger that still precedes the key
+
+    def find_successor(self, idx: int, key_id: int) -> Tuple[int, int]:
+        ids = self.id_list
+        n = len(ids)
+        hops = 0
+        while not in_range(key_id, ids[idx], ids[(idx + 1) % n], True):
+            next_idx = self.closest_preceding(idx, key_id)
+            if next_idx == idx:
+                break
+            idx = next_idx
+            hops += 1
+        return (idx + 1) % n, hops + 1
+
+    def route_many(self, key_ids, start: int = 0):
+        #find_successor for a whole batch of keys: every still-routing key takes one hop per iteration,
+        #so the loop runs O(log N) times over arrays instead of once per key
+        keys = self._key_array(key_ids)
+        n = len(self.nodes)
+        curr = np.full(len(keys), start, dtype=np.int64)
+        hops = np.zeros(len(keys), dtype=np.int64)
+        if n == 1:
+            return curr, hops + 1
+        active = np.arange(len(keys))
+        while len(active):
+            c = curr[active]
+            node_ids = self.ids[c]
+            dist = (keys[active] - node_ids) & self._mask
+            succ_dist = (self.ids[(c + 1) % n] - node_ids) & self._mask
+            routing = (dist == 0) | (dist > succ_dist) #key is not in (node, successor]
+            active, c, dist = active[routing], c[routing], dist[routing]
+            if not len(active):
+                break
+            t = np.count_nonzero(self.finger_dist[c] < dist[:, None], axis=1)
+            moved = t > 0
+            active, c, t = active[moved], c[moved], t[moved]
+            curr[active] = self.fingers[c, t - 1]
+            hops[active] += 1
+        return (curr + 1) % n, hops + 1
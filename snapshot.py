@@ -0,0 +1,176 @@
+import mmap
+import os
+import pickle
+import struct
+import sys
+import zlib
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from DHT import DHT
+from node import Node
+from src.common.column_store import ColumnStore
+
+# Snapshot layout (little endian):
+#   header     magic, m_bits, number of nodes, flags (array_ring, pointers, compressed), tokens per host,
+#              length of the hosts section
+#   ids        N x uint64, node ids in ring order
+#   fingers    N x m x int32, finger i of every node as a ring position
+#   hosts      pickled list, the physical node every ring position belongs to
+#   pointers   only with the pointers flag: r (uint32), then N x int32 successors, N x int32 predecessors and
+#              N x r x int32 successor lists, as ring positions (-1 for none)
+#   offsets    (N + 1) x uint64, where each node's data segment starts/ends in the file
+#   segments   one per node: its column store (see src/common/column_store.py), then its sorted key index,
+#              zlib-compressed with the compressed flag
+# Only the header, ids, fingers and offsets are read when loading. A node's segment is
+# mapped in the first time its data is touched, so restart time does not depend on the key count.
+# A ring whose pointers were all set by the DHT is relinked on load. One still converging after join_lazy/fail
+# keeps the successor, predecessor and successor list every node had, so stabilize rounds resume where they stopped.
+# Crashed nodes are not saved: a pointer to one is stored as none (a finger as the node itself, which lookups skip),
+# the same state check_predecessor / fix_fingers would leave behind.
+
+MAGIC = b"CHORDSN3"
+HEADER = struct.Struct("<8sIIBIQ")
+ARRAY_RING = 1
+POINTERS = 2
+#every replica holds its own copy of the rows. The day ordinals, small ids and zero back offsets of the columns
+#shrink to about a third with the fastest zlib level, and each segment can still be read on its own
+COMPRESSED = 4
+POINTERS_HEADER = struct.Struct("<I")
+
+
+def _little_endian(arr: array) -> array:
+    if sys.byteorder != "little":
+        arr.byteswap()
+    return arr
+
+
+class _Segment:
+    __slots__ = ("mm", "start", "end", "compressed")
+
+    def __init__(self, mm: mmap.mmap, start: int, end: int, compressed: bool):
+        self.mm = mm
+        self.start = start
+        self.end = end
+        self.compressed = compressed
+
+    def raw(self) -> bytes:
+        return self.mm[self.start:self.end]
+
+    def load(self) -> Tuple[ColumnStore, List[int], List[str]]:
+        raw = self.raw()
+        return pickle.loads(zlib.decompress(raw) if self.compressed else raw)
+
+
+def _segment_bytes(node: Node) -> bytes:
+    segment = node._segment
+    if node._data is None and segment is not None: #never touched since the last load, copy the bytes as they are
+        return segment.raw() if segment.compressed else zlib.compress(segment.raw(), 1)
+    node.sort_index()
+    return zlib.compress(pickle.dumps((node.data, node.key_ids, node.key_names), protocol=pickle.HIGHEST_PROTOCOL), 1)
+
+
+def _pointer_bytes(d: DHT, pos_of_slot: Dict[int, int]) -> bytes:
+    r = d.successor_list_len
+
+    def pos(node: Optional[Node]) -> int:
+        return pos_of_slot[node.slot] if node is not None and node.alive else -1
+
+    successors = array("i", (pos_of_slot[node.live_successor().slot] for node in d.nodes))
+    predecessors = array("i", (pos(node.predecessor) for node in d.nodes))
+    lists = array("i")
+    for node in d.nodes:
+        row = [pos(s) for s in node.successors if s.alive][:r]
+        lists.extend(row + [-1] * (r - len(row)))
+    return POINTERS_HEADER.pack(r) + b"".join(_little_endian(a).tobytes() for a in (successors, predecessors, lists))
+
+
+def _read_pointers(d: DHT, mm: mmap.mmap, pos: int) -> int:
+    #the inverse of _pointer_bytes, returns where the section ends
+    n_nodes = len(d.nodes)
+    (r,) = POINTERS_HEADER.unpack_from(mm, pos)
+    pos += POINTERS_HEADER.size
+    successors = _little_endian(array("i", mm[pos:pos + 4 * n_nodes]))
+    pos += 4 * n_nodes
+    predecessors = _little_endian(array("i", mm[pos:pos + 4 * n_nodes]))
+    pos += 4 * n_nodes
+    lists = _little_endian(array("i", mm[pos:pos + 4 * n_nodes * r]))
+    pos += 4 * n_nodes * r
+    nodes = d.nodes
+    for i, node in enumerate(nodes):
+        node.successor = nodes[successors[i]]
+        node.predecessor = nodes[predecessors[i]] if predecessors[i] >= 0 else None
+        node.successors = [nodes[p] for p in lists[i * r:(i + 1) * r] if p >= 0]
+    d.successor_list_len = r
+    d._lazy = True
+    return pos
+
+
+def save_snapshot(d: DHT, path: str) -> None:
+    n_nodes = len(d.nodes)
+    ids = array("Q", d.ids)
+    pos_of_slot = {node.slot: i for i, node in enumerate(d.nodes)}
+    if d.array_ring and d.ring is not None:
+        fingers = array("i", d.ring.fingers.ravel().tolist())
+    else:
+        fingers = array("i", (pos_of_slot.get(s, i) for i, node in enumerate(d.nodes) for s in node.fingers))
+
+    hosts = pickle.dumps([node.host for node in d.nodes], protocol=pickle.HIGHEST_PROTOCOL)
+    flags = COMPRESSED | (ARRAY_RING if d.array_ring else 0)
+    pointers = b""
+    if d._lazy:
+        flags |= POINTERS
+        pointers = _pointer_bytes(d, pos_of_slot)
+
+    tmp_path = path + ".tmp" #written aside first, the old snapshot may still be mapped by a loaded DHT
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, d.m_bits, n_nodes, flags, d.vnodes, len(hosts)))
+        f.write(_little_endian(ids).tobytes())
+        f.write(_little_endian(fingers).tobytes())
+        f.write(hosts)
+        f.write(pointers)
+        offsets_at = f.tell()
+        f.write(bytes(8 * (n_nodes + 1))) #offsets are filled in once the segments are written
+        offsets = array("Q", [f.tell()])
+        for node in d.nodes:
+            f.write(_segment_bytes(node))
+            offsets.append(f.tell())
+        f.seek(offsets_at)
+        f.write(_little_endian(offsets).tobytes())
+    os.replace(tmp_path, path)
+
+
+def load_snapshot(path: str) -> DHT:
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) #the map stays valid after the file is closed
+
+    magic, m_bits, n_nodes, flags, vnodes, hosts_len = HEADER.unpack_from(mm, 0)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a DHT snapshot")
+    pos = HEADER.size
+    ids = _little_endian(array("Q", mm[pos:pos + 8 * n_nodes]))
+    pos += 8 * n_nodes
+    fingers = _little_endian(array("i", mm[pos:pos + 4 * n_nodes * m_bits]))
+    pos += 4 * n_nodes * m_bits
+    hosts = pickle.loads(mm[pos:pos + hosts_len])
+    pos += hosts_len
+
+    d = DHT(m_bits, vnodes=vnodes)
+    for i, node_id in enumerate(ids):
+        node = Node(node_id, m_bits, d.table) #fresh table, so a node's slot is its ring position
+        node.fingers = fingers[i * m_bits:(i + 1) * m_bits]
+        if hosts[i] is not None:
+            d._add_host(hosts[i], node)
+        d.nodes.append(node)
+    d.ids = ids.tolist()
+    if flags & POINTERS:
+        pos = _read_pointers(d, mm, pos)
+    else:
+        d._link_ring()
+    offsets = _little_endian(array("Q", mm[pos:pos + 8 * (n_nodes + 1)]))
+    for i, node in enumerate(d.nodes):
+        node._segment = _Segment(mm, offsets[i], offsets[i + 1], bool(flags & COMPRESSED))
+    if flags & ARRAY_RING:
+        d.array_ring = True
+        d._build_array_ring()
+    return d
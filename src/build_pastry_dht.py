@@ -1,10 +1,10 @@
-import pandas as pd
+import os
 import time
 import random
 import string
-from concurrent.futures import ProcessPoolExecutor, as_completed
-from multiprocessing import cpu_count, freeze_support
+from multiprocessing import freeze_support
 from .pastry.utils_pastry import normalize_title
+from .common.ingest import ingest
 from tqdm import tqdm
 
 
@@ -19,18 +19,9 @@ M_BITS = 64
 BATCH_SIZE = 50000
 
 
-def make_chunks(n_rows: int, batch_size: int):
-    for start in range(0, n_rows, batch_size):
-        end = min(start + batch_size, n_rows)
-        yield start, end
-
-
-def process_chunk(start: int, end: int, csv_path: str):
-    df = pd.read_csv(csv_path, skiprows=range(1, start + 1), nrows=end - start)
-    movies = []
-    for _, row in df.iterrows():
-        movies.append((row["title"], row["id"], row.to_dict()))
-    return movies
+def movie_records(df):
+    # (title, id, όλες οι στήλες) ανά γραμμή, με πράξεις σε στήλες αντί για iterrows
+    return list(zip(df["title"].tolist(), df["id"].tolist(), df.to_dict("records")))
 
 
 def insert_movies(dht: PastryDHT, movies):
@@ -51,18 +42,6 @@ if __name__ == "__main__":
     # ===============================
     build_start = time.perf_counter()
 
-    print("------Loading dataset size------")
-    n_rows = len(pd.read_csv(CSV_PATH))
-    print(f"Total rows: {n_rows}")
-
-
-    def insert_movies(dht: PastryDHT, movies):
-        for i, (title, movie_id, attrs) in enumerate(movies):
-            if i % 100000 == 0:
-                print(f"Inserted {i} movies...")
-            dht.put(title, movie_id, attrs)
-
-
     # --- Create DHT nodes ---
     t_nodes_start = time.perf_counter()
 
@@ -73,33 +52,24 @@ if __name__ == "__main__":
     t_nodes_end = time.perf_counter()
     print(f"[TIME] Node creation: {t_nodes_end - t_nodes_start:.6f} sec")
 
-    # --- Dataset chunking ---
-    chunks = list(make_chunks(n_rows, BATCH_SIZE))
-    print(f"{len(chunks)} chunks")
-
-    # --- Parallel loading ---
+    # --- Streaming load + insert ---
+    # ένα πέρασμα στο αρχείο: ο reader διαβάζει το επόμενο chunk όσο εισάγεται το τρέχον
     t_load_start = time.perf_counter()
 
     all_movies = []
-    with ProcessPoolExecutor(max_workers=cpu_count()) as executor:
-        futures = [
-            executor.submit(process_chunk, s, e, CSV_PATH)
-            for s, e in chunks
-        ]
-
-        for f in tqdm(as_completed(futures), total=len(futures), desc="Loading CSV"):
-            all_movies.extend(f.result())
+    progress = tqdm(desc="Loading CSV", unit=" movies")
 
-    t_load_end = time.perf_counter()
-    print(f"[TIME] Dataset loading: {t_load_end - t_load_start:.2f} sec")
-
-    # --- Insert into DHT ---
-    t_insert_start = time.perf_counter()
+    def consume(movies):
+        insert_movies(dht, movies)
+        all_movies.extend(movies)
+        progress.update(len(movies))
 
-    insert_movies(dht, all_movies)
+    n_rows = ingest(CSV_PATH, movie_records, consume, chunksize=BATCH_SIZE)
+    progress.close()
 
-    t_insert_end = time.perf_counter()
-    print(f"[TIME] Insert movies into DHT: {t_insert_end - t_insert_start:.2f} sec")
+    t_load_end = time.perf_counter()
+    print(f"Total rows: {n_rows}")
+    print(f"[TIME] Dataset loading + insert into DHT: {t_load_end - t_load_start:.2f} sec")
 
 
 
@@ -147,20 +117,20 @@ if __name__ == "__main__":
     # ===============================
     # PARALLEL LOOKUP BENCHMARK
     # ===============================
+    # όλοι οι τίτλοι του αρχείου μαζί, με get_many: ένα κομμάτι διαφορετικών keys ανά worker
     print("\n------Running PARALLEL lookup benchmark------")
 
-    parallel_times = []
-
-    for title in lookup_titles:
+    workers = os.cpu_count() or 1
+    for label, kwargs in (("batched", {}),
+                          (f"{workers} threads", {"workers": workers}),
+                          (f"{workers} processes", {"workers": workers, "processes": True})):
+        dht.get_many(csv_titles[:1], **kwargs)  # το pool ξεκινά εδώ, έξω από τη μέτρηση
         start = time.perf_counter()
-        dht.get_parallel(title)
+        dht.get_many(csv_titles, **kwargs)
         end = time.perf_counter()
-        parallel_times.append(end - start)
-
-    avg_parallel = sum(parallel_times) / len(parallel_times)
-
-    print(f"[PARALLEL LOOKUP] Average time over {NUM_LOOKUPS} queries: "
-        f"{avg_parallel:.6f} sec")
+        print(f"[PARALLEL LOOKUP] {label}: {len(csv_titles) / (end - start):.0f} lookups/sec "
+              f"over {len(csv_titles)} titles")
+    dht.close()
 
 
 
@@ -358,18 +328,23 @@ if __name__ == "__main__":
         name = f"TempNode_{i}"
 
         t1 = time.perf_counter()
-        dht.join(name)
+        temp_node = dht.join(name)
         t2 = time.perf_counter()
         join_times.append(t2 - t1)
 
         t3 = time.perf_counter()
-        dht.leave(name)
+        dht.leave(temp_node.id)  # το leave παίρνει id, όχι όνομα
         t4 = time.perf_counter()
         leave_times.append(t4 - t3)
 
     print(f"[JOIN] Avg time: {sum(join_times)/len(join_times):.6f} sec")
     print(f"[LEAVE] Avg time: {sum(leave_times)/len(leave_times):.6f} sec")
 
+    # περιοδική επισκευή: τα κενά που άφησαν τα leave γεμίζουν ξανά
+    t_repair_start = time.perf_counter()
+    repaired = dht.repair_tables()
+    print(f"[REPAIR] {repaired} routing table entries filled in {time.perf_counter() - t_repair_start:.6f} sec")
+
      # Επιλογή ενός τυχαίου κόμβου για να δούμε το Leaf Set του
     sample_node = dht.nodes[0] 
     print(f"Leaf Set of Node {sample_node.id_str}: {[n.id_str for n in sample_node.leaf_set]}")
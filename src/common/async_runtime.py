@@ -0,0 +1,199 @@
+import asyncio
+import math
+import random
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# ---------------------------------------------------------------
+# Πρωτόκολλα: ένα βήμα δρομολόγησης ενός lookup, που το εκτελεί ο
+# κόμβος που κρατά το μήνυμα εκείνη τη στιγμή. step() δίνει (node, done):
+# τον επόμενο κόμβο για προώθηση, ή την απάντηση όταν done είναι True.
+# ---------------------------------------------------------------
+class ChordProtocol:
+    def __init__(self, dht):
+        from node import in_range  # το Chord βρίσκεται στη ρίζα του repo
+
+        self.dht = dht
+        self.max_hops = None
+        self.in_range = in_range
+
+    def key_id(self, title: str) -> int:
+        return self.dht._hash_key(title)
+
+    def entry(self):
+        return self.dht.nodes[0]
+
+    def step(self, node, key_id: int) -> Tuple[Any, bool]:
+        if self.in_range(key_id, node.id, node.successor.id, True):
+            return node.successor, True
+        next_node = node.closest_preceding_node(key_id)
+        if next_node is node:
+            return node.successor, True
+        return next_node, False
+
+
+class PastryProtocol:
+    def __init__(self, dht):
+        self.dht = dht
+        self.max_hops = int(math.log2(len(dht.nodes))) + 2 if dht.nodes else None  # ίδιο όριο με το PastryDHT.route_key
+
+    def key_id(self, title: str) -> int:
+        from ..pastry.utils_pastry import normalize_title
+        from .hash_utils import hash_to_int
+
+        return hash_to_int(normalize_title(title), self.dht.m_bits)
+
+    def entry(self):
+        return self.dht.nodes[0]
+
+    def step(self, node, key_id: int) -> Tuple[Any, bool]:
+        next_node = node.route(key_id)
+        if next_node.id == node.id:
+            return node, True
+        return next_node, False
+
+
+def protocol_for(dht):
+    if hasattr(dht, "route_key"):  # PastryDHT
+        return PastryProtocol(dht)
+    return ChordProtocol(dht)
+
+
+def _resolve(reply: asyncio.Future, result) -> None:
+    if not reply.done():
+        reply.set_result(result)
+
+
+class _Lookup:
+    __slots__ = ("key_id", "hops", "reply")
+
+    def __init__(self, key_id: int, reply: asyncio.Future):
+        self.key_id = key_id
+        self.hops = 0
+        self.reply = reply
+
+
+class AsyncRuntime:
+    """Κάθε κόμβος είναι ένα asyncio task με inbox· ένα lookup είναι μήνυμα που προωθείται
+    hop προς hop, και κάθε σύνδεση προσθέτει latency +- jitter (δευτερόλεπτα)"""
+
+    def __init__(self, protocol, latency: float = 0.001, jitter: float = 0.0002, seed: Optional[int] = None):
+        self.protocol = protocol
+        self.latency = latency
+        self.jitter = jitter
+        self.rng = random.Random(seed)
+        self.inboxes: Dict[int, asyncio.Queue] = {}
+        self.tasks: List[asyncio.Task] = []
+
+    def _delay(self) -> float:
+        return max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter))
+
+    def _send(self, node, msg: _Lookup) -> None:
+        loop = asyncio.get_running_loop()
+        loop.call_later(self._delay(), self.inboxes[id(node)].put_nowait, (node, msg))
+
+    def _reply(self, msg: _Lookup, result) -> None:
+        asyncio.get_running_loop().call_later(self._delay(), _resolve, msg.reply, result)
+
+    async def _serve(self, inbox: asyncio.Queue) -> None:
+        max_hops = self.protocol.max_hops
+        while True:
+            node, msg = await inbox.get()
+            next_node, done = self.protocol.step(node, msg.key_id)
+            msg.hops += 1
+            if done or (max_hops is not None and msg.hops >= max_hops):
+                self._reply(msg, (next_node, msg.hops))
+            else:
+                self._send(next_node, msg)
+
+    def start(self, nodes) -> None:
+        for node in nodes:
+            inbox = asyncio.Queue()
+            self.inboxes[id(node)] = inbox
+            self.tasks.append(asyncio.create_task(self._serve(inbox)))
+
+    async def stop(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks.clear()
+        self.inboxes.clear()
+
+    async def lookup(self, key_id: int, entry=None):
+        msg = _Lookup(key_id, asyncio.get_running_loop().create_future())
+        self._send(entry if entry is not None else self.protocol.entry(), msg)
+        return await msg.reply
+
+    async def run_load(self, key_ids: List[int], concurrency: int) -> Dict[str, float]:
+        latencies: List[float] = []
+        hops: List[int] = []
+        gate = asyncio.Semaphore(concurrency)
+
+        async def client(key_id: int) -> None:
+            async with gate:
+                t0 = time.perf_counter()
+                _, h = await self.lookup(key_id)
+                latencies.append(time.perf_counter() - t0)
+                hops.append(h)
+
+        t_start = time.perf_counter()
+        await asyncio.gather(*(client(k) for k in key_ids))
+        elapsed = time.perf_counter() - t_start
+        return summarize(latencies, hops, elapsed)
+
+
+def _percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+def summarize(latencies: List[float], hops: List[int], elapsed: float) -> Dict[str, float]:
+    lat = sorted(latencies)
+    return {
+        "lookups": len(lat),
+        "throughput": len(lat) / elapsed if elapsed > 0 else 0.0,
+        "avg_hops": sum(hops) / len(hops) if hops else 0.0,
+        "p50_ms": 1000 * _percentile(lat, 50),
+        "p95_ms": 1000 * _percentile(lat, 95),
+        "p99_ms": 1000 * _percentile(lat, 99),
+        "max_ms": 1000 * (lat[-1] if lat else 0.0),
+    }
+
+
+def benchmark(dht, titles: List[str], concurrency: int = 64, latency: float = 0.001,
+              jitter: float = 0.0002, seed: Optional[int] = None) -> Dict[str, float]:
+    """Ταυτόχρονα lookups των titles σε DHT ή PastryDHT μέσα από το runtime μηνυμάτων"""
+    protocol = protocol_for(dht)
+    key_ids = [protocol.key_id(t) for t in titles]
+
+    async def main():
+        runtime = AsyncRuntime(protocol, latency, jitter, seed)
+        runtime.start(dht.nodes)
+        try:
+            return await runtime.run_load(key_ids, concurrency)
+        finally:
+            await runtime.stop()
+
+    return asyncio.run(main())
+
+
+if __name__ == "__main__":
+    # python -m src.common.async_runtime, από τη ρίζα του repo
+    from DHT import DHT
+    from src.pastry.dht_pastry import PastryDHT
+
+    titles = [f"movie {i}" for i in range(5000)]
+    chord = DHT.from_node_names([f"node{i}" for i in range(300)], m_bits=64)
+    pastry = PastryDHT(m_bits=64)
+    for i in range(300):
+        pastry.join(f"Node{i}")
+
+    for name, dht in (("Chord", chord), ("Pastry", pastry)):
+        for concurrency in (1, 16, 256):
+            stats = benchmark(dht, titles, concurrency=concurrency, seed=1)
+            print(f"{name:7} concurrency={concurrency:<4} "
+                  f"{stats['throughput']:>9.0f} lookups/s  hops={stats['avg_hops']:.2f}  "
+                  f"p50={stats['p50_ms']:.2f}ms  p95={stats['p95_ms']:.2f}ms  p99={stats['p99_ms']:.2f}ms")
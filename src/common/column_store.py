@@ -0,0 +1,686 @@
+import bisect
+import sys
+from array import array
+from datetime import date
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+# ---------------------------------------------------------------
+# Columnar αποθήκη εγγραφών ενός κόμβου.
+# Κάθε εγγραφή (dict) γίνεται μία γραμμή και κάθε πεδίο έχει τη δική
+# του στήλη: array για ακέραιους, floats και ημερομηνίες ISO, κωδικούς
+# λεξικού για strings που επαναλαμβάνονται, ένα utf-8 blob για κείμενο
+# και λίστα αντικειμένων (με interned strings) για ό,τι άλλο.
+# Οι γραμμές ενός κλειδιού δένονται προς τα πίσω: heads[key] είναι η
+# τελευταία του γραμμή και back[row] πόσες γραμμές πιο πίσω είναι η
+# προηγούμενη (0 στην πρώτη). Οι αποστάσεις δεν αλλάζουν όταν οι γραμμές
+# μετακινούνται όλες μαζί, οπότε το merge τις αντιγράφει ως έχουν.
+# ---------------------------------------------------------------
+CAT_LIMIT = 4096  # πάνω από τόσες διαφορετικές τιμές (και μισές από τις γραμμές) ένα λεξικό γίνεται κείμενο
+COMPACT_MIN = 1024  # λιγότερες σβησμένες γραμμές από αυτές δεν αξίζει να συμπτυχθούν
+INSORT_MAX = 16  # μέχρι τόσα νέα κλειδιά μπαίνουν στο ταξινομημένο ευρετήριο ένα-ένα, αλλιώς ξαναχτίζεται όταν χρειαστεί
+
+
+class _Missing:
+    """Πεδίο που η εγγραφή δεν έχει (μόνο σε στήλες αντικειμένων)"""
+
+    __slots__ = ()
+
+    def __reduce__(self):
+        return "_MISSING"  # ίδιο αντικείμενο και μετά από pickle
+
+    def __repr__(self) -> str:
+        return "_MISSING"
+
+
+class _Whole:
+    """Όνομα της στήλης που κρατά ολόκληρες τις τιμές που δεν είναι dict"""
+
+    __slots__ = ()
+
+    def __reduce__(self):
+        return "_WHOLE"
+
+    def __repr__(self) -> str:
+        return "_WHOLE"
+
+
+_MISSING = _Missing()
+_WHOLE = _Whole()
+
+
+def _intern(value: Any) -> Any:
+    return sys.intern(value) if type(value) is str else value
+
+
+def _is_nan(value: Any) -> bool:
+    return type(value) is float and value != value  # έτσι δίνει το pandas τα κενά κελιά
+
+
+def _iso_ordinal(value: Any) -> Optional[int]:
+    if type(value) is str and len(value) == 10 and value[4] == "-" and value[7] == "-":
+        try:
+            return date.fromisoformat(value).toordinal()
+        except ValueError:
+            return None
+    return 0 if _is_nan(value) else None
+
+
+# -----------------------------
+# Columns. extend() βάζει όλες τις τιμές ή καμία (False όταν κάποια δεν χωράει)
+# -----------------------------
+class _IntColumn:
+    __slots__ = ("values",)
+
+    def __init__(self):
+        self.values = array("q")
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def extend(self, values: List[Any]) -> bool:
+        if set(map(type, values)) - {int} or (values and (min(values) < -(1 << 63) or max(values) >= 1 << 63)):
+            return False
+        self.values.extend(values)
+        return True
+
+    def get(self, row: int) -> Any:
+        return self.values[row]
+
+    def at(self, rows: List[int]) -> List[Any]:
+        values = self.values
+        return [values[r] for r in rows]
+
+    def decoded(self) -> List[Any]:
+        return self.values.tolist()
+
+    def take(self, rows: List[int]) -> "_IntColumn":
+        col = type(self)()
+        values = self.values
+        col.values.extend([values[r] for r in rows])
+        return col
+
+    def merge(self, other: Any) -> bool:
+        if type(other) is not type(self):
+            return False
+        self.values.extend(other.values)
+        return True
+
+
+class _FloatColumn(_IntColumn):
+    __slots__ = ()
+
+    def __init__(self):
+        self.values = array("d")
+
+    def extend(self, values: List[Any]) -> bool:
+        if set(map(type, values)) - {float}:
+            return False
+        self.values.extend(values)
+        return True
+
+
+class _DateColumn(_IntColumn):
+    # ημερομηνίες "YYYY-MM-DD" σαν ordinal, 0 για NaN
+    __slots__ = ()
+
+    def __init__(self):
+        self.values = array("i")
+
+    def extend(self, values: List[Any]) -> bool:
+        ords = [_iso_ordinal(v) for v in values]
+        if None in ords:
+            return False
+        self.values.extend(ords)
+        return True
+
+    def get(self, row: int) -> Any:
+        o = self.values[row]
+        return date.fromordinal(o).isoformat() if o else float("nan")
+
+    def at(self, rows: List[int]) -> List[Any]:
+        ords = [self.values[r] for r in rows]
+        text = {o: date.fromordinal(o).isoformat() if o else float("nan") for o in set(ords)}  # κάθε ημερομηνία μία φορά
+        return [text[o] for o in ords]
+
+    def decoded(self) -> List[Any]:
+        return [date.fromordinal(o).isoformat() if o else float("nan") for o in self.values]
+
+
+class _CatColumn:
+    # strings που επαναλαμβάνονται: κωδικός ανά γραμμή, κάθε διαφορετική τιμή μία φορά (-1 για NaN)
+    __slots__ = ("codes", "strings", "index")
+
+    def __init__(self):
+        self.codes = array("i")
+        self.strings: List[str] = []
+        self.index: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getstate__(self):
+        return self.codes, self.strings
+
+    def __setstate__(self, state) -> None:
+        self.codes, self.strings = state
+        self.index = {s: i for i, s in enumerate(self.strings)}
+
+    def _codes(self, values: List[Any]) -> Optional[List[int]]:
+        index, strings = self.index, self.strings
+        codes = []
+        for v in values:
+            code = index.get(v) if type(v) is str else (-1 if _is_nan(v) else None)
+            if code is None:
+                if type(v) is not str:
+                    return None
+                code = index[v] = len(strings)
+                strings.append(sys.intern(v))
+            codes.append(code)
+        return codes
+
+    def extend(self, values: List[Any]) -> bool:
+        n = len(self.strings)
+        codes = self._codes(values)
+        if codes is None:
+            for s in self.strings[n:]:
+                del self.index[s]
+            del self.strings[n:]
+            return False
+        self.codes.extend(codes)
+        return True
+
+    def too_big(self) -> bool:
+        return len(self.strings) > CAT_LIMIT and 2 * len(self.strings) > len(self.codes)
+
+    def get(self, row: int) -> Any:
+        code = self.codes[row]
+        return self.strings[code] if code >= 0 else float("nan")
+
+    def at(self, rows: List[int]) -> List[Any]:
+        strings, nan = self.strings, float("nan")
+        return [strings[c] if c >= 0 else nan for c in map(self.codes.__getitem__, rows)]
+
+    def decoded(self) -> List[Any]:
+        strings, nan = self.strings, float("nan")
+        return [strings[c] if c >= 0 else nan for c in self.codes]
+
+    def take(self, rows: List[int]) -> "_CatColumn":
+        col = _CatColumn()
+        col.extend([self.get(r) for r in rows])
+        return col
+
+    def merge(self, other: Any) -> bool:
+        if type(other) is not _CatColumn:
+            return False
+        remap = self._codes(other.strings)  # κωδικός του other -> κωδικός εδώ
+        remap.append(-1)  # ο -1 του NaN μένει -1
+        self.codes.extend([remap[c] for c in other.codes])
+        return True
+
+
+class _TextColumn:
+    # κείμενο που σχεδόν δεν επαναλαμβάνεται: όλα τα strings σε ένα utf-8 blob,
+    # ends[row] είναι το τέλος της γραμμής, -end - 1 για NaN
+    __slots__ = ("blob", "ends")
+
+    def __init__(self):
+        self.blob = bytearray()
+        self.ends = array("q")
+
+    def __len__(self) -> int:
+        return len(self.ends)
+
+    def extend(self, values: List[Any]) -> bool:
+        if set(map(type, values)) - {str, float} or any(type(v) is float and v == v for v in values):
+            return False
+        blob, ends = self.blob, self.ends
+        end = len(blob)
+        for v in values:
+            if type(v) is str:
+                blob += v.encode("utf-8", "surrogatepass")
+                end = len(blob)
+                ends.append(end)
+            else:
+                ends.append(-end - 1)
+        return True
+
+    def get(self, row: int) -> Any:
+        end = self.ends[row]
+        if end < 0:
+            return float("nan")
+        start = self.ends[row - 1] if row else 0
+        if start < 0:
+            start = -start - 1
+        return self.blob[start:end].decode("utf-8", "surrogatepass")
+
+    def at(self, rows: List[int]) -> List[Any]:
+        return [self.get(r) for r in rows]
+
+    def decoded(self) -> List[Any]:
+        return [self.get(r) for r in range(len(self.ends))]
+
+    def take(self, rows: List[int]) -> "_TextColumn":
+        col = _TextColumn()
+        col.extend([self.get(r) for r in rows])
+        return col
+
+    def merge(self, other: Any) -> bool:
+        if type(other) is not _TextColumn:
+            return False
+        shift = len(self.blob)
+        self.blob += other.blob
+        self.ends.extend([e + shift if e >= 0 else e - shift for e in other.ends])
+        return True
+
+
+class _ObjColumn:
+    __slots__ = ("values",)
+
+    def __init__(self, values: Optional[List[Any]] = None):
+        self.values: List[Any] = values if values is not None else []
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def extend(self, values: List[Any]) -> bool:
+        self.values.extend([_intern(v) for v in values])
+        return True
+
+    def get(self, row: int) -> Any:
+        return self.values[row]
+
+    def at(self, rows: List[int]) -> List[Any]:
+        values = self.values
+        return [values[r] for r in rows]
+
+    def decoded(self) -> List[Any]:
+        return list(self.values)
+
+    def take(self, rows: List[int]) -> "_ObjColumn":
+        values = self.values
+        return _ObjColumn([values[r] for r in rows])
+
+    def merge(self, other: Any) -> bool:
+        if type(other) is not _ObjColumn:
+            return False
+        self.values.extend(other.values)  # τα strings είναι ήδη interned από εκεί που φτιάχτηκαν
+        return True
+
+
+def _new_column(values: List[Any], keys: List[Any]):
+    # ο τύπος της στήλης βγαίνει από την πρώτη τιμή που δεν είναι NaN
+    for v in values:
+        t = type(v)
+        if t is int:
+            return _IntColumn()
+        if t is float and v == v:
+            return _FloatColumn()
+        if t is str:
+            if _iso_ordinal(v) is not None:
+                return _DateColumn()
+            if all(a is b or a == b for a, b in zip(values, keys)):
+                return _ObjColumn()  # το πεδίο είναι το ίδιο το key (π.χ. title), δείχνει στο interned key
+            return _CatColumn()
+        if not _is_nan(v):
+            return _ObjColumn()
+    return _FloatColumn() if values else _ObjColumn()
+
+
+class ColumnStore:
+    """key -> λίστα εγγραφών, όπως το Dict[str, List[dict]] που αντικαθιστά.
+    get() φτιάχνει καινούργια dicts σε κάθε κλήση, οι αλλαγές γίνονται με append/extend/replace/remove"""
+
+    __slots__ = ("heads", "back", "columns", "n_rows", "garbage", "order")
+
+    def __init__(self, records: Optional[Dict[Any, List[dict]]] = None):
+        self.heads: Dict[Any, int] = {}
+        self.back = array("i")
+        self.columns: Dict[Any, Any] = {}  # πεδίο -> στήλη, μία θέση ανά γραμμή
+        self.n_rows = 0
+        self.garbage = 0  # γραμμές που σβήστηκαν και περιμένουν compact()
+        self.order: Optional[List[str]] = None  # τα string keys ταξινομημένα, χτίζεται στην πρώτη prefix/range αναζήτηση
+        if records:
+            for key, values in records.items():
+                self.extend(key, values)
+
+    # -----------------------------
+    # Mapping interface
+    # -----------------------------
+    def __len__(self) -> int:
+        return len(self.heads)
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self.heads
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self.heads)
+
+    def keys(self):
+        return self.heads.keys()
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        row = self.heads.get(key)
+        if row is None:
+            return default
+        return [self._record(r) for r in self._rows_from(row)]
+
+    def get_many(self, keys: List[Any], default: Any = None) -> List[Any]:
+        """get() για πολλά keys μαζί: κάθε στήλη αποκωδικοποιείται μία φορά για όλες τις γραμμές τους"""
+        heads, back = self.heads, self.back
+        rows: List[int] = []
+        counts: List[int] = []  # γραμμές ανά key, -1 όταν το key λείπει
+        for key in keys:
+            row = heads.get(key)
+            if row is None:
+                counts.append(-1)
+            elif not back[row]:  # μία εγγραφή, η συνηθισμένη περίπτωση
+                rows.append(row)
+                counts.append(1)
+            else:
+                chain = self._rows_from(row)
+                rows.extend(chain)
+                counts.append(len(chain))
+        records = self._records(rows)
+        out = []
+        pos = 0
+        for n in counts:
+            if n < 0:
+                out.append(default)
+            else:
+                out.append(records[pos:pos + n])
+                pos += n
+        return out
+
+    def __getitem__(self, key: Any) -> List[dict]:
+        values = self.get(key)
+        if values is None:
+            raise KeyError(key)
+        return values
+
+    def items(self) -> Iterator[Tuple[Any, List[dict]]]:
+        for key, row in self.heads.items():
+            yield key, [self._record(r) for r in self._rows_from(row)]
+
+    def values(self) -> Iterator[List[dict]]:
+        for _, records in self.items():
+            yield records
+
+    def count(self, key: Any) -> int:
+        row = self.heads.get(key)
+        return 0 if row is None else len(self._rows_from(row))
+
+    def __setitem__(self, key: Any, records: List[dict]) -> None:
+        self._unlink(key)
+        self.extend(key, records)
+
+    def __delitem__(self, key: Any) -> None:
+        if key not in self.heads:
+            raise KeyError(key)
+        self._unlink(key)
+
+    def pop(self, key: Any, *default: Any) -> List[dict]:
+        if key not in self.heads:
+            if default:
+                return default[0]
+            raise KeyError(key)
+        records = self.get(key)
+        self._unlink(key)
+        return records
+
+    def __eq__(self, other: Any) -> bool:
+        # ίδια κλειδιά με τις ίδιες εγγραφές, όπως σε ένα dict (συγκρίνεται και με dict)
+        if not isinstance(other, (ColumnStore, dict)):
+            return NotImplemented
+        if self.keys() != other.keys():
+            return False
+        return all(self.get(key) == other.get(key) for key in self.heads)
+
+    __hash__ = None
+
+    def __getstate__(self):
+        # οι γραμμές των κλειδιών πάνε σαν ένα array αντί για ένα int ανά κλειδί
+        return list(self.heads), array("i", self.heads.values()), self.back, self.columns, self.n_rows, self.garbage
+
+    def __setstate__(self, state) -> None:
+        keys, rows, self.back, self.columns, self.n_rows, self.garbage = state
+        self.heads = dict(zip(keys, rows))
+        self.order = None
+
+    def clear(self) -> None:
+        self.__init__()
+
+    def __repr__(self) -> str:
+        return f"ColumnStore({len(self.heads)} keys, {self.n_rows - self.garbage} rows)"
+
+    # -----------------------------
+    # Sorted key index
+    # -----------------------------
+    def sorted_keys(self) -> List[str]:
+        """Τα string keys σε σειρά (όσα δεν είναι string, π.χ. NaN τίτλοι, δεν μπαίνουν)"""
+        if self.order is None:
+            self.order = sorted(key for key in self.heads if type(key) is str)
+        return self.order
+
+    def key_range(self, lo: str, hi: Optional[str] = None, limit: Optional[int] = None) -> List[str]:
+        """Τα keys με lo <= key < hi (χωρίς hi μέχρι το τέλος), τα πρώτα limit"""
+        order = self.sorted_keys()
+        start = bisect.bisect_left(order, lo)
+        end = bisect.bisect_left(order, hi) if hi is not None else len(order)
+        if limit is not None:
+            end = min(end, start + limit)
+        return order[start:end]
+
+    def key_prefix(self, prefix: str, limit: Optional[int] = None) -> List[str]:
+        """Τα keys που ξεκινούν με prefix, τα πρώτα limit"""
+        order = self.sorted_keys()
+        start = end = bisect.bisect_left(order, prefix)
+        stop = len(order) if limit is None else min(len(order), start + limit)
+        while end < stop and order[end].startswith(prefix):
+            end += 1
+        return order[start:end]
+
+    def _index_added(self, keys: List[Any]) -> None:
+        if self.order is None or not keys:
+            return
+        if len(keys) > INSORT_MAX:
+            self.order = None
+            return
+        for key in keys:
+            if type(key) is str:
+                bisect.insort(self.order, key)
+
+    def _index_removed(self, key: Any) -> None:
+        if self.order is not None and type(key) is str:
+            i = bisect.bisect_left(self.order, key)
+            if i < len(self.order) and self.order[i] == key:
+                del self.order[i]
+
+    # -----------------------------
+    # Writes
+    # -----------------------------
+    def append(self, key: Any, record: dict) -> None:
+        self.append_rows([key], [record])
+
+    def extend(self, key: Any, records: Iterable[dict]) -> None:
+        records = list(records)
+        self.append_rows([key] * len(records), records)
+
+    def append_rows(self, keys: List[Any], records: List[dict]) -> None:
+        """Προσθέτει records[i] στο keys[i], όλη η παρτίδα στήλη-στήλη"""
+        if not records:
+            return
+        start = self.n_rows
+        heads, back = self.heads, self.back
+        keys = [_intern(key) for key in keys]
+        tracked = self.order is not None
+        new_keys = []
+        for row, key in enumerate(keys, start):
+            last = heads.get(key)
+            if last is None:
+                back.append(0)
+                if tracked:
+                    new_keys.append(key)
+            else:
+                back.append(row - last)
+            heads[key] = row
+        self._index_added(new_keys)
+
+        fields = dict.fromkeys(self.columns)
+        last = None
+        whole = False
+        for record in records:
+            if type(record) is not dict:
+                whole = True
+            elif record.keys() != last:
+                fields.update(dict.fromkeys(record))
+                last = record.keys()
+        if whole:
+            fields[_WHOLE] = None
+            for field in fields:
+                values = [r if type(r) is not dict else _MISSING for r in records] if field is _WHOLE else \
+                         [r.get(field, _MISSING) if type(r) is dict else _MISSING for r in records]
+                self._extend_column(field, values, keys, start)
+        else:
+            for field in fields:
+                self._extend_column(field, [r.get(field, _MISSING) for r in records], keys, start)
+        self.n_rows = start + len(records)
+
+    def merge(self, other: "ColumnStore") -> None:
+        """Προσθέτει όλες τις γραμμές του other μετά από τις δικές της, στήλη-στήλη (το περιεχόμενο του other μένει ίδιο)"""
+        if other.garbage:
+            other.compact()
+        if not other.n_rows:
+            return
+        offset = self.n_rows
+        heads, back = self.heads, self.back
+        if self.order is not None:
+            self._index_added(list(other.heads.keys() - heads.keys()))
+        back.extend(other.back)
+        for key in heads.keys() & other.heads.keys():  # η πρώτη γραμμή του key στο other συνεχίζει την αλυσίδα του εδώ
+            first = other._rows_from(other.heads[key])[0] + offset
+            back[first] = first - heads[key]
+        heads.update(zip(other.heads.keys(), [row + offset for row in other.heads.values()]))
+
+        columns = self.columns
+        for field in dict.fromkeys([*columns, *other.columns]):
+            theirs = other.columns.get(field)
+            ours = columns.get(field)
+            if ours is None and not offset:
+                ours = columns[field] = type(theirs)()
+            if theirs is not None and ours is not None and ours.merge(theirs):
+                continue
+            values = theirs.decoded() if theirs is not None else [_MISSING] * other.n_rows
+            self._extend_column(field, values, None, offset)
+        self.n_rows = offset + other.n_rows
+
+    def replace(self, key: Any, i: int, record: dict) -> None:
+        """Η i-οστή εγγραφή του key γίνεται record: γράφεται σαν καινούργια γραμμή στην ίδια θέση της αλυσίδας"""
+        rows = self._rows_from(self.heads[key])
+        old = rows[i]
+        before = self.back[old]
+        self.append_rows([key], [record])
+        new = self.n_rows - 1
+        back = self.back
+        back[new] = new - (old - before) if before else 0
+        if i == len(rows) - 1:
+            self.heads[key] = new
+        else:
+            self.heads[key] = rows[-1]
+            back[rows[i + 1]] = rows[i + 1] - new  # αρνητική απόσταση, η νέα γραμμή είναι πιο μετά
+        self.garbage += 1
+        self._maybe_compact()
+
+    def remove(self, key: Any, i: int) -> None:
+        """Σβήνει την i-οστή εγγραφή του key, και το ίδιο το key όταν δεν μείνει καμία"""
+        rows = self._rows_from(self.heads[key])
+        row = rows[i]
+        back = self.back
+        if i == len(rows) - 1:
+            if back[row] == 0:
+                del self.heads[key]
+                self._index_removed(key)
+            else:
+                self.heads[key] = row - back[row]
+        else:
+            back[rows[i + 1]] = back[rows[i + 1]] + back[row] if back[row] else 0
+        self.garbage += 1
+        self._maybe_compact()
+
+    def compact(self) -> None:
+        """Ξαναγράφει τις στήλες μόνο με τις ζωντανές γραμμές, με τη σειρά των κλειδιών"""
+        live: List[int] = []
+        heads: Dict[Any, int] = {}
+        back = array("i")
+        for key, row in self.heads.items():
+            rows = self._rows_from(row)
+            back.append(0)
+            back.extend([1] * (len(rows) - 1))  # οι γραμμές κάθε κλειδιού μπαίνουν η μία μετά την άλλη
+            live.extend(rows)
+            heads[key] = len(live) - 1
+        self.columns = {field: column.take(live) for field, column in self.columns.items()}
+        self.heads, self.back = heads, back
+        self.n_rows, self.garbage = len(live), 0
+
+    # -----------------------------
+    # Internals
+    # -----------------------------
+    def _rows_from(self, row: int) -> List[int]:
+        rows = [row]
+        back = self.back
+        while back[row]:
+            row -= back[row]
+            rows.append(row)
+        rows.reverse()
+        return rows
+
+    def _record(self, row: int) -> Any:
+        record = {}
+        for field, column in self.columns.items():
+            value = column.get(row)
+            if value is not _MISSING:
+                if field is _WHOLE:
+                    return value
+                record[field] = value
+        return record
+
+    def _records(self, rows: List[int]) -> List[Any]:
+        # _record για πολλές γραμμές, στήλη-στήλη. Με κενά πεδία ή τιμές που δεν είναι dict μένει το _record ανά γραμμή
+        if not rows:
+            return []
+        columns = self.columns
+        values = [column.at(rows) for column in columns.values()]
+        if _WHOLE in columns or any(type(column) is _ObjColumn and any(v is _MISSING for v in vals)
+                                    for column, vals in zip(columns.values(), values)):
+            return [self._record(r) for r in rows]
+        fields = list(columns)
+        return [dict(zip(fields, row)) for row in zip(*values)]
+
+    def _extend_column(self, field: Any, values: List[Any], keys: Optional[List[Any]], start: int) -> None:
+        column = self.columns.get(field)
+        if column is None:
+            if start:  # καινούργιο πεδίο, οι παλιότερες γραμμές δεν το έχουν
+                column = _ObjColumn([_MISSING] * start)
+            else:
+                column = _new_column(values, keys or [])
+            self.columns[field] = column
+        if not column.extend(values):  # τιμή άλλου τύπου, η στήλη γίνεται στήλη αντικειμένων
+            column = _ObjColumn()
+            column.extend(self.columns[field].decoded())
+            column.extend(values)
+            self.columns[field] = column
+        if type(column) is _CatColumn and column.too_big():
+            text = _TextColumn()
+            text.extend(column.decoded())
+            self.columns[field] = text
+
+    def _unlink(self, key: Any) -> None:
+        row = self.heads.pop(key, None)
+        if row is not None:
+            self._index_removed(key)
+            self.garbage += len(self._rows_from(row))
+            self._maybe_compact()
+
+    def _maybe_compact(self) -> None:
+        if self.garbage >= COMPACT_MIN and 2 * self.garbage > self.n_rows:
+            self.compact()
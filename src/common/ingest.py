@@ -0,0 +1,66 @@
+import queue
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+# Ένα πέρασμα πάνω στο CSV: ένα thread το διαβάζει chunk-chunk (ο tokenizer του pandas
+# αφήνει το GIL) και δίνει τα έτοιμα batches στον καλούντα μέσα από μια φραγμένη ουρά, έτσι
+# το επόμενο chunk διαβάζεται όσο μπαίνει το τρέχον και στη μνήμη μένουν το πολύ
+# queue_size batches. Κάθε γραμμή διαβάζεται μία φορά, ο χρόνος είναι γραμμικός στο μέγεθος του αρχείου.
+
+_DONE = object()
+
+
+def key_value_records(df: pd.DataFrame, key_column: str, columns: Optional[Sequence[str]] = None) -> List[Tuple[Any, Dict[str, Any]]]:
+    """(key, {column: value}) για κάθε γραμμή, ανά στήλη αντί για iterrows"""
+    values = df if columns is None else df[list(columns)]
+    return list(zip(df[key_column].tolist(), values.to_dict("records")))
+
+
+def _produce(path: str, convert: Optional[Callable[[pd.DataFrame], List]], out: queue.Queue, chunksize: int,
+             usecols: Optional[Sequence[str]], stop: threading.Event, errors: List[BaseException]) -> None:
+    try:
+        for chunk in pd.read_csv(path, usecols=usecols, chunksize=chunksize):
+            if stop.is_set():
+                break
+            out.put(convert(chunk) if convert is not None else chunk)
+    except BaseException as e:  # το σφάλμα φτάνει στον consumer, όχι σιωπηλά στο thread
+        errors.append(e)
+    finally:
+        out.put(_DONE)
+
+
+def stream(path: str, convert: Optional[Callable[[pd.DataFrame], List]] = None, chunksize: int = 50000,
+           queue_size: int = 4, usecols: Optional[Sequence[str]] = None) -> Iterator:
+    """Δίνει convert(chunk) για κάθε chunk του path (το ίδιο το DataFrame χωρίς convert), που ένα thread διαβάζει από πριν"""
+    batches: queue.Queue = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    errors: List[BaseException] = []
+    reader = threading.Thread(target=_produce, args=(path, convert, batches, chunksize, usecols, stop, errors),
+                              daemon=True)
+    reader.start()
+    try:
+        while True:
+            batch = batches.get()
+            if batch is _DONE:
+                break
+            yield batch
+    finally:
+        if reader.is_alive():  # ο consumer σταμάτησε νωρίτερα, σταμάτα τον reader και άδειασε την ουρά
+            stop.set()
+            while batches.get() is not _DONE:
+                pass
+        reader.join()
+    if errors:
+        raise errors[0]
+
+
+def ingest(path: str, convert: Callable[[pd.DataFrame], List], consume: Callable[[List], None],
+           chunksize: int = 50000, queue_size: int = 4, usecols: Optional[Sequence[str]] = None) -> int:
+    """Περνά το path από convert(chunk) -> batch και consume(batch)· επιστρέφει πόσες εγγραφές πέρασαν"""
+    total = 0
+    for batch in stream(path, convert, chunksize, queue_size, usecols):
+        consume(batch)
+        total += len(batch)
+    return total
@@ -0,0 +1,46 @@
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+class LocationCache:
+    """Φραγμένη LRU cache: hash του κλειδιού -> ο κόμβος που το έχει, ισχύει για ένα epoch του δακτυλίου"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.entries: "OrderedDict[int, Any]" = OrderedDict()
+        self.epoch = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _sync(self, epoch: int) -> None:
+        # έγινε join/leave από τότε που μπήκαν οι εγγραφές, οποιαδήποτε μπορεί να είναι παλιά
+        if epoch != self.epoch:
+            self.entries.clear()
+            self.epoch = epoch
+
+    def get(self, key_id: int, epoch: int) -> Optional[Any]:
+        self._sync(epoch)
+        node = self.entries.get(key_id)
+        if node is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key_id)
+        self.hits += 1
+        return node
+
+    def put(self, key_id: int, node: Any, epoch: int) -> None:
+        self._sync(epoch)
+        self.entries[key_id] = node
+        self.entries.move_to_end(key_id)
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
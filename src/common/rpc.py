@@ -0,0 +1,241 @@
+import asyncio
+import multiprocessing
+import socket
+import struct
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+# Frame: μήκος payload (u32), id αιτήματος (u32), op / status (u8) και μετά το payload.
+# Μια σύνδεση κουβαλά πολλά frames το ένα πίσω από το άλλο, οπότε ο client στέλνει
+# αιτήματα σε pipeline και διαβάζει τις απαντήσεις μετά· ο server απαντά με τη σειρά.
+FRAME = struct.Struct("!IIB")
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+Address = Tuple[str, int]
+
+
+class RemoteRef:
+    """Θέση κόμβου που ζει σε άλλη διεργασία: ξέρουμε μόνο το id του"""
+
+    __slots__ = ("id",)
+
+    def __init__(self, node_id: int):
+        self.id = node_id
+
+    def __repr__(self) -> str:
+        return f"RemoteRef(id={self.id})"
+
+
+class RpcError(RuntimeError):
+    pass
+
+
+# -----------------------------
+# Πλευρά server
+# -----------------------------
+async def _handle_connection(handler, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        while True:
+            header = await reader.readexactly(FRAME.size)
+            length, req_id, op = FRAME.unpack(header)
+            payload = await reader.readexactly(length) if length else b""
+            try:
+                reply, status = handler.handle(op, payload), STATUS_OK
+            except Exception as e:  # το σφάλμα γυρνά στον καλούντα, ο server συνεχίζει
+                reply, status = repr(e).encode(), STATUS_ERROR
+            writer.write(FRAME.pack(len(reply), req_id, status) + reply)
+            await writer.drain()  # επιστρέφει αμέσως εκτός αν ο client σταμάτησε να διαβάζει
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def _serve(handlers, host: str, ports: Sequence[int]) -> None:
+    servers = []
+    for handler, port in zip(handlers, ports):
+        servers.append(await asyncio.start_server(
+            lambda r, w, h=handler: _handle_connection(h, r, w), host, port))
+    await asyncio.gather(*(s.serve_forever() for s in servers))
+
+
+def serve_forever(handlers, host: str, ports: Sequence[int]) -> None:
+    """Τρέχει έναν TCP server ανά handler σε αυτή τη διεργασία"""
+    asyncio.run(_serve(handlers, host, ports))
+
+
+class Cluster:
+    """Μοιράζει τους handlers σε worker διεργασίες, ένα localhost port ανά handler.
+    Τα ports ξεκινούν κάτω από το συνηθισμένο ephemeral εύρος (32768+), όπου μπορεί να τα κρατούν ήδη client sockets"""
+
+    def __init__(self, handlers: List, host: str = "127.0.0.1", base_port: int = 30000, processes: int = 4):
+        self.host = host
+        self.ports = [base_port + i for i in range(len(handlers))]
+        self.handlers = handlers
+        self.n_processes = max(1, min(processes, len(handlers)))
+        self.procs: List[multiprocessing.Process] = []
+
+    def addresses(self) -> List[Address]:
+        return [(self.host, port) for port in self.ports]
+
+    def start(self, timeout: float = 30.0) -> None:
+        for p in range(self.n_processes):
+            part = range(p, len(self.handlers), self.n_processes)
+            proc = multiprocessing.Process(
+                target=serve_forever,
+                args=([self.handlers[i] for i in part], self.host, [self.ports[i] for i in part]),
+                daemon=True,
+            )
+            proc.start()
+            self.procs.append(proc)
+        deadline = time.monotonic() + timeout
+        for address in self.addresses():  # περίμενε ώσπου κάθε server να δέχεται συνδέσεις
+            while True:
+                try:
+                    socket.create_connection(address, timeout=1).close()
+                    break
+                except OSError:
+                    if time.monotonic() > deadline or any(proc.exitcode is not None for proc in self.procs):
+                        self.stop()
+                        raise
+                    time.sleep(0.05)
+
+    def stop(self) -> None:
+        for proc in self.procs:
+            proc.terminate()
+        for proc in self.procs:
+            proc.join()
+        self.procs.clear()
+
+    def __enter__(self) -> "Cluster":
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+# -----------------------------
+# Πλευρά client
+# -----------------------------
+class RpcConnection:
+    def __init__(self, address: Address):
+        self.sock = socket.create_connection(address)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.next_id = 0
+
+    def _recv_exactly(self, n: int) -> bytes:
+        buf = bytearray()
+        while len(buf) < n:
+            chunk = self.sock.recv(n - len(buf))
+            if not chunk:
+                raise ConnectionError("connection closed by the node")
+            buf += chunk
+        return bytes(buf)
+
+    def send_many(self, requests: Sequence[Tuple[int, bytes]]) -> List[int]:
+        ids = []
+        frames = []
+        for op, payload in requests:
+            self.next_id = (self.next_id + 1) & 0xFFFFFFFF
+            ids.append(self.next_id)
+            frames.append(FRAME.pack(len(payload), self.next_id, op) + payload)
+        self.sock.sendall(b"".join(frames))
+        return ids
+
+    def recv_many(self, ids: Sequence[int]) -> List[bytes]:
+        replies = []
+        for req_id in ids:
+            length, reply_id, status = FRAME.unpack(self._recv_exactly(FRAME.size))
+            body = self._recv_exactly(length) if length else b""
+            if reply_id != req_id:
+                raise RpcError(f"reply {reply_id} does not match request {req_id}")
+            if status != STATUS_OK:
+                raise RpcError(body.decode(errors="replace"))
+            replies.append(body)
+        return replies
+
+    def call_many(self, requests: Sequence[Tuple[int, bytes]]) -> List[bytes]:
+        """Στέλνει πρώτα κάθε (op, payload) και μόνο μετά διαβάζει τις απαντήσεις"""
+        return self.recv_many(self.send_many(requests))
+
+    def call(self, op: int, payload: bytes = b"") -> bytes:
+        return self.call_many([(op, payload)])[0]
+
+    def close(self) -> None:
+        self.sock.close()
+
+
+class ConnectionPool:
+    """Μόνιμες συνδέσεις ανά διεύθυνση, που ξαναχρησιμοποιούνται από κλήσεις και threads"""
+
+    def __init__(self, max_idle: int = 4):
+        self.max_idle = max_idle
+        self.idle: Dict[Address, List[RpcConnection]] = {}
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def connection(self, address: Address) -> Iterator[RpcConnection]:
+        with self.lock:
+            free = self.idle.get(address)
+            conn = free.pop() if free else None
+        if conn is None:
+            conn = RpcConnection(address)
+        try:
+            yield conn
+        except Exception:
+            conn.close()  # το stream μπορεί να έχει χάσει τη σειρά του, δεν ξαναχρησιμοποιείται
+            raise
+        with self.lock:
+            free = self.idle.setdefault(address, [])
+            if len(free) < self.max_idle:
+                free.append(conn)
+                conn = None
+        if conn is not None:
+            conn.close()
+
+    def call(self, address: Address, op: int, payload: bytes = b"") -> bytes:
+        with self.connection(address) as conn:
+            return conn.call(op, payload)
+
+    def call_many(self, address: Address, requests: Sequence[Tuple[int, bytes]]) -> List[bytes]:
+        with self.connection(address) as conn:
+            return conn.call_many(requests)
+
+    def scatter(self, batches: Dict[Address, Sequence[Tuple[int, bytes]]]) -> Dict[Address, List[bytes]]:
+        """Στέλνει κάθε batch στη διεύθυνσή του σε pipeline· όλα φεύγουν πριν διαβαστεί απάντηση,
+        έτσι κόμβοι σε διαφορετικές διεργασίες τα επεξεργάζονται ταυτόχρονα"""
+        with ExitStack() as stack:
+            sent = []
+            for address, requests in batches.items():
+                conn = stack.enter_context(self.connection(address))
+                sent.append((address, conn, conn.send_many(requests)))
+            return {address: conn.recv_many(ids) for address, conn, ids in sent}
+
+    def close(self) -> None:
+        with self.lock:
+            for conns in self.idle.values():
+                for conn in conns:
+                    conn.close()
+            self.idle.clear()
+
+
+# -----------------------------
+# Βοηθητικά για τα payloads
+# -----------------------------
+KEY_ID = struct.Struct("!Q")
+STEP_REPLY = struct.Struct("!BQ")
+KEY_LEN = struct.Struct("!H")
+
+
+def pack_key_value(key: str, value: bytes) -> bytes:
+    raw = key.encode("utf-8")
+    return KEY_LEN.pack(len(raw)) + raw + value
+
+
+def unpack_key_value(payload: bytes) -> Tuple[str, bytes]:
+    (n,) = KEY_LEN.unpack_from(payload)
+    return payload[KEY_LEN.size:KEY_LEN.size + n].decode("utf-8"), payload[KEY_LEN.size + n:]
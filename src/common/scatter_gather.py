@@ -0,0 +1,65 @@
+import heapq
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
+from operator import itemgetter
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+Scan = Tuple[str, str, Optional[str], Optional[int]]  # ("prefix", prefix, None, limit) ή ("range", lo, hi, limit)
+
+
+# ---------------------------------------------------------------
+# Scatter-gather αναζητήσεις πάνω σε όλους τους κόμβους.
+# Κάθε κόμβος απαντά μόνος του από το ταξινομημένο ευρετήριο των
+# keys του (ColumnStore.key_prefix / key_range) και οι απαντήσεις
+# συγχωνεύονται σε ένα ταξινομημένο ρεύμα, χωρίς πλήρες σκανάρισμα.
+# ---------------------------------------------------------------
+def merge_sorted(streams: Sequence[Iterable[Tuple[Any, Any]]], limit: Optional[int] = None) -> Iterator[Tuple[Any, Any]]:
+    """(key, value) ζεύγη από ρεύματα ταξινομημένα κατά key, σε ένα ταξινομημένο ρεύμα.
+    Ένα key που έρχεται από πολλούς κόμβους (αντίγραφα) βγαίνει μία φορά, από τον πρώτο"""
+    if limit is not None and limit <= 0:
+        return
+    count = 0
+    last = None
+    for key, value in heapq.merge(*streams, key=itemgetter(0)):
+        if count and key == last:
+            continue
+        yield key, value
+        last = key
+        count += 1
+        if count == limit:
+            return
+
+
+def scatter_gather(nodes: Sequence[Any], select: Callable[[Any], List[Any]], fetch: Callable[[Any, Any], Any],
+                   limit: Optional[int] = None, workers: int = 1) -> Iterator[Tuple[Any, Any, Any]]:
+    """select(node) δίνει τα ταξινομημένα keys ενός κόμβου, όλοι οι κόμβοι ρωτιούνται μαζί (με workers > 1 σε threads).
+    Επιστρέφει ρεύμα (key, node, fetch(node, key)): οι εγγραφές φτιάχνονται μόνο για τα keys που διαβάζονται"""
+    if workers > 1 and len(nodes) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            selected = list(executor.map(select, nodes))
+    else:
+        selected = [select(node) for node in nodes]
+    streams = [zip(keys, repeat(node)) for node, keys in zip(nodes, selected) if keys]
+    for key, node in merge_sorted(streams, limit):
+        yield key, node, fetch(node, key)
+
+
+# -----------------------------
+# Πάνω από node servers (rpc.py): ένα αίτημα σε κάθε κόμβο, όλα μαζί με ConnectionPool.scatter
+# -----------------------------
+def scan(store, request: Scan) -> List[Tuple[str, List[Any]]]:
+    """Η απάντηση ενός κόμβου: τα keys του που ταιριάζουν, ταξινομημένα, με τις εγγραφές τους"""
+    kind, a, b, limit = request
+    keys = store.key_prefix(a, limit) if kind == "prefix" else store.key_range(a, b, limit)
+    return [(key, store.get(key)) for key in keys]
+
+
+def remote_scan(pool, directory: Dict[int, Any], op: int, request: Scan) -> Iterator[Tuple[str, int, List[Any]]]:
+    """(key, node id, εγγραφές) από όλους τους node servers του directory, συγχωνευμένα σε σειρά key"""
+    payload = pickle.dumps(request, protocol=pickle.HIGHEST_PROTOCOL)
+    replies = pool.scatter({address: [(op, payload)] for address in directory.values()})
+    streams = [[(key, (node_id, records)) for key, records in pickle.loads(replies[address][0])]
+               for node_id, address in directory.items()]
+    for key, (node_id, records) in merge_sorted(streams, request[3]):
+        yield key, node_id, records
@@ -1,29 +1,75 @@
-from typing import Optional, Any, List
-from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Any, Dict, Iterable, Iterator, List, Tuple
+from array import array
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import chain
 
 from .node_pastry import Node
 from ..common.hash_utils import hash_to_int
 from .utils_pastry import normalize_title
+from ..common.location_cache import LocationCache
+from ..common.scatter_gather import scatter_gather
+import bisect
 import math
 
 class PastryDHT:
-    def __init__(self, m_bits: int = 64, b: int = 4):
+    def __init__(self, m_bits: int = 64, b: int = 4, cache_size: int = 0, leaf_size: int = 4):
         self.m_bits = m_bits
         self.b = b
-        self.nodes: List[Node] = []
+        self.leaf_size = leaf_size  # L: L/2 γείτονες από κάθε πλευρά
+        self.nodes: List[Node] = []  # σε σειρά join, το route_key ξεκινά από τον πρώτο
+        self.ring: List[Node] = []  # οι ίδιοι κόμβοι σε σειρά id
+        self.ids: List[int] = []  # τα ταξινομημένα ids, παράλληλα με το self.ring
+        self.epoch = 0  # αυξάνεται σε κάθε join/leave
+        self.cache: Optional[LocationCache] = LocationCache(cache_size) if cache_size > 0 else None
+        # pool του get_many, μένει ανοιχτό ανάμεσα στις κλήσεις (threads, ή processes με αντίγραφο του routing)
+        self._pool: Optional[Executor] = None
+        self._pool_kind: Optional[Tuple[int, bool]] = None
+        self._pool_epoch = -1
 
     # -----------------------------
     # Node management
     # -----------------------------
+    def _leaf_sets_at(self, pos: int) -> None:
+        # το leaf set του κόμβου στη θέση pos του δακτυλίου, κατευθείαν από τους γείτονές του στο ευρετήριο
+        ring = self.ring
+        n = len(ring)
+        half = self.leaf_size // 2
+        if n - 1 <= 2 * half:
+            cw = [ring[(pos + j) % n] for j in range(1, n // 2 + 1)]
+            ccw = [ring[(pos - j) % n] for j in range(1, n - len(cw))]
+            ring[pos].set_leaf_set(ccw, cw, True)
+        else:
+            ccw = [ring[(pos - j) % n] for j in range(1, half + 1)]
+            cw = [ring[(pos + j) % n] for j in range(1, half + 1)]
+            ring[pos].set_leaf_set(ccw, cw, False)
+
+    def _refresh_leaf_sets(self, pos: int) -> None:
+        # μετά από join/leave στη θέση pos αλλάζει μόνο το leaf set των L/2 κόμβων κάθε πλευράς
+        n = len(self.ring)
+        if n == 0:
+            return
+        half = self.leaf_size // 2
+        if n - 1 <= 2 * half + 1:  # μικρός δακτύλιος, όλοι βλέπουν όλους
+            positions = range(n)
+        else:
+            positions = dict.fromkeys((pos + j) % n for j in range(-half, half + 1))
+        for p in positions:
+            self._leaf_sets_at(p)
+
     def join(self, node_name: str) -> Node:
         node_id = hash_to_int(node_name, self.m_bits)
-        new_node = Node(node_id, self.b)
+        new_node = Node(node_id, self.b, self.leaf_size)
+
+        self.epoch += 1
 
         if not self.nodes:
             self.nodes.append(new_node)
+            self.ring.append(new_node)
+            self.ids.append(node_id)
             return new_node
 
-        # Pastry join routing
+        # Pastry join routing: ο i-οστός κόμβος της διαδρομής έχει κοινά με τον νέο τουλάχιστον i ψηφία,
+        # ο νέος κόμβος παίρνει από τον καθένα τις γραμμές του πίνακα που ισχύουν και γι' αυτόν
         current = self.nodes[0]
 
         max_steps = int(math.log2(len(self.nodes) + 1)) + 5
@@ -33,40 +79,58 @@ class PastryDHT:
             steps += 1
             next_node = current.route(new_node.id)
 
-            current.update_routing_table(new_node)
-            new_node.update_routing_table(current)
+            new_node.copy_rows(current)
 
             if next_node.id == current.id or steps >= max_steps:
                 break
 
             current = next_node
 
-        # Leaf set
+        # Leaf set: θέση στο ευρετήριο με bisect, ενημερώνονται μόνο οι γείτονες
+        # (το ίδιο leaf set που θα έδινε ο πλησιέστερος κόμβος, current)
         self.nodes.append(new_node)
-
-        for n in self.nodes:
-            if n.id != new_node.id:
-                new_node.update_leaf_set(n)
-                n.update_leaf_set(new_node)
+        pos = bisect.bisect_right(self.ids, node_id)
+        self.ids.insert(pos, node_id)
+        self.ring.insert(pos, new_node)
+        self._refresh_leaf_sets(pos)
+        for n in new_node.leaf_set:
+            new_node.update_routing_table(n)
+
+        # ο νέος κόμβος στέλνει την κατάστασή του σε όσους ξέρει, αυτοί τον βάζουν στους πίνακές τους
+        for n in new_node.known_nodes():
+            n.update_routing_table(new_node)
         return new_node
 
 
     def leave(self, node_id: int) -> None:
-        node = next((n for n in self.nodes if n.id == node_id), None)
-        if not node:
+        pos = bisect.bisect_left(self.ids, node_id)
+        if pos == len(self.ids) or self.ids[pos] != node_id:
             return
+        node = self.ring[pos]
 
         self.nodes.remove(node)
+        del self.ring[pos]
+        del self.ids[pos]
+        self.epoch += 1
 
-        for n in self.nodes:
-            # leaf set cleanup
-            n.leaf_set = [x for x in n.leaf_set if x.id != node_id]
+        # leaf set cleanup: μόνο οι γείτονές του τον είχαν
+        self._refresh_leaf_sets(pos)
 
-            # routing table cleanup
-            for i in range(len(n.routing_table)):
-                for j in range(len(n.routing_table[i])):
-                    if n.routing_table[i][j] and n.routing_table[i][j].id == node_id:
-                        n.routing_table[i][j] = None
+        # routing table cleanup: μόνο όσοι τον έχουν στον πίνακά τους, το κελί γεμίζει αμέσως από γείτονες
+        node.forget_entries()
+        for holder in node.held_by:
+            holder.replace_entry(node)
+        node.held_by.clear()
+
+
+    def repair_tables(self) -> int:
+        # περιοδικό πέρασμα επισκευής: κάθε κόμβος γεμίζει τα κενά του πίνακά του (π.χ. μετά από leave)
+        # ρωτώντας τους κόμβους που ήδη ξέρει. Επιστρέφει πόσα κελιά γέμισαν
+        max_hops = self._max_hops()
+        filled = sum(node.repair_routing_table(max_hops) for node in self.nodes)
+        if filled:
+            self.epoch += 1  # οι διαδρομές άλλαξαν, τα αντίγραφα του routing στα processes ξαναφτιάχνονται
+        return filled
 
 
     # -----------------------------
@@ -82,7 +146,7 @@ class PastryDHT:
             return
 
         node, _ = self.locate_node(norm_title)
-        node.data[norm_title].append(value)
+        node.data.append(norm_title, value)
         return node
     
     def update(self, title: str, movie_id: int, new_attrs: dict) -> bool:
@@ -97,7 +161,7 @@ class PastryDHT:
 
         for i, movie in enumerate(node.data[norm_title]):
             if movie.get("id") == movie_id:
-                node.data[norm_title][i] = new_attrs
+                node.data.replace(norm_title, i, new_attrs)
                 return True
 
         return False
@@ -113,15 +177,9 @@ class PastryDHT:
         if norm_title not in node.data:
             return False
 
-        movies = node.data[norm_title]
-
-        for i, movie in enumerate(movies):
+        for i, movie in enumerate(node.data[norm_title]):
             if movie.get("id") == movie_id:
-                del movies[i]
-
-                if not movies:
-                    del node.data[norm_title]
-
+                node.data.remove(norm_title, i)  # σβήνει και τον τίτλο όταν δεν μείνει ταινία
                 return True
 
         return False
@@ -135,46 +193,182 @@ class PastryDHT:
         if norm_title is None:
             return [], 0, None
 
-        node, hops = self.locate_node(norm_title)
+        key_id = hash_to_int(norm_title, self.m_bits)
+        node = self.cache.get(key_id, self.epoch) if self.cache is not None else None
+        if node is not None:
+            hops = 1
+        else:
+            node, hops = self.route_key(key_id)
+            if self.cache is not None:
+                self.cache.put(key_id, node, self.epoch)
         # Επιστρέφουμε: (λίστα ταινιών, αριθμός hops, το ID του κόμβου)
         return node.data.get(norm_title, []), hops, node.id_str
 
 
-    def get_parallel(self, title: str, k: int = 4):
-        norm_title = normalize_title(title)
-        if norm_title is None:
-            return [], 0
-
-        results = []
-        hop_counts = []
-
-        def lookup():
-            node, hops = self.locate_node(norm_title)
-            return node, hops
+    def get_parallel(self, title: str):
+        # ο Pastry κρατά κάθε τίτλο σε έναν μόνο κόμβο, άρα ένα lookup δεν έχει αντίγραφα να μοιραστεί:
+        # μένει για συμβατότητα ως get, παράλληλα διαβάζουν πολλοί τίτλοι μαζί με το get_many
+        movies, hops, _ = self.get(title)
+        return movies, hops
 
-        with ThreadPoolExecutor(max_workers=k) as executor:
-            futures = [executor.submit(lookup) for _ in range(k)]
-
-            for f in futures:
-                node, hops = f.result()
-                if norm_title in node.data:
-                    results.extend(node.data[norm_title])
-                    hop_counts.append(hops)
+    def get_many(self, titles: Iterable[str], workers: int = 1, processes: bool = False,
+                 chunk_size: int = 1024) -> List[Tuple[List[Any], int, Optional[str]]]:
+        """
+        Πολλά get μαζί: (ταινίες, hops, id κόμβου) για κάθε τίτλο, με τη σειρά τους.
+        Κάθε διαφορετικός τίτλος δρομολογείται μία φορά, σε κομμάτια των chunk_size keys.
+        Με workers > 1 τα κομμάτια μοιράζονται σε threads, με processes=True σε workers processes
+        που δρομολογούν πάνω σε αντίγραφο μόνο του routing state (τα δεδομένα μένουν εδώ)
+        """
+        norms = [normalize_title(title) for title in titles]
+        if not self.nodes:
+            return [([], 0, None) for _ in norms]
+
+        key_ids: Dict[str, int] = {}
+        for norm in norms:
+            if norm is not None and norm not in key_ids:
+                key_ids[norm] = hash_to_int(norm, self.m_bits)
+
+        located: Dict[str, Tuple[Node, int]] = {}
+        todo = []
+        for norm, key_id in key_ids.items():
+            node = self.cache.get(key_id, self.epoch) if self.cache is not None else None
+            if node is not None:
+                located[norm] = (node, 1)
+            else:
+                todo.append(norm)
+
+        chunks = [[key_ids[norm] for norm in todo[i:i + chunk_size]] for i in range(0, len(todo), chunk_size)]
+        for norm, (node, hops) in zip(todo, chain.from_iterable(self._route_chunks(chunks, workers, processes))):
+            located[norm] = (node, hops)
+            if self.cache is not None:
+                self.cache.put(key_ids[norm], node, self.epoch)
+
+        out: List[Tuple[List[Any], int, Optional[str]]] = []
+        for norm in norms:
+            if norm is None:
+                out.append(([], 0, None))
+            else:
+                node, hops = located[norm]
+                out.append((node.data.get(norm, []), hops, node.id_str))
+        return out
+
+    def _route_chunks(self, chunks: List[List[int]], workers: int, processes: bool) -> List[List[Tuple[Node, int]]]:
+        if processes:
+            nodes = self.nodes
+            batches = self._get_pool(workers, True).map(_route_batch, chunks)
+            return [[(nodes[pos], hops) for pos, hops in batch] for batch in batches]
+        if workers > 1 and len(chunks) > 1:
+            return list(self._get_pool(workers, False).map(self._route_batch, chunks))
+        return [self._route_batch(chunk) for chunk in chunks]
+
+    def _route_batch(self, key_ids: List[int]) -> List[Tuple[Node, int]]:
+        return [self.route_key(key_id) for key_id in key_ids]
+
+    def _get_pool(self, workers: int, processes: bool) -> Executor:
+        # το ίδιο pool για όλες τις κλήσεις, εκτός αν αλλάξει το μέγεθος ή (για processes) ο δακτύλιος
+        if self._pool is not None and (self._pool_kind != (workers, processes) or
+                                       processes and self._pool_epoch != self.epoch):
+            self.close()
+        if self._pool is None:
+            if processes:
+                self._pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_routing,
+                                                 initargs=(_routing_snapshot(self.nodes), self._max_hops()))
+            else:
+                self._pool = ThreadPoolExecutor(max_workers=workers)
+            self._pool_kind = (workers, processes)
+            self._pool_epoch = self.epoch
+        return self._pool
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+            self._pool_kind = None
 
-        return results, min(hop_counts) if hop_counts else ([], 0)
 
+    # -----------------------------
+    # Prefix / range αναζητήσεις
+    # -----------------------------
+    def prefix_query(self, prefix: str, limit: Optional[int] = None, workers: int = 1) -> Iterator[Tuple[str, str, List[Any]]]:
+        """
+        Όλοι οι κόμβοι απαντούν από το ταξινομημένο ευρετήριο των τίτλων τους,
+        (τίτλος, id κόμβου, ταινίες) σε αλφαβητική σειρά, οι πρώτοι limit
+        """
+        norm = _normalize_bound(prefix)
+        if norm is None:
+            return iter(())
+        results = scatter_gather(self.nodes, lambda node: node.data.key_prefix(norm, limit), _fetch, limit, workers)
+        return ((title, node.id_str, movies) for title, node, movies in results)
+
+    def range_query(self, lo: str, hi: Optional[str] = None, limit: Optional[int] = None,
+                    workers: int = 1) -> Iterator[Tuple[str, str, List[Any]]]:
+        """
+        Οι τίτλοι με lo <= τίτλος < hi, όπως το prefix_query
+        """
+        lo = _normalize_bound(lo) or ""
+        hi = _normalize_bound(hi) if hi is not None else None
+        results = scatter_gather(self.nodes, lambda node: node.data.key_range(lo, hi, limit), _fetch, limit, workers)
+        return ((title, node.id_str, movies) for title, node, movies in results)
 
     def locate_node(self, key):
-        key_id = hash_to_int(key, self.m_bits)
-        current = self.nodes[0]
-        hops = 0
-        max_hops = int(math.log2(len(self.nodes))) + 2
-
-        while hops < max_hops:
-            hops += 1
-            next_node = current.route(key_id)
-            if next_node.id == current.id:
-                return current, hops
-            current = next_node
-
-        return current, hops
+        return self.route_key(hash_to_int(key, self.m_bits))
+
+    def _max_hops(self) -> int:
+        return int(math.log2(len(self.nodes))) + 2
+
+    def route_key(self, key_id: int):
+        return self.nodes[0].lookup(key_id, self._max_hops())
+
+
+def _normalize_bound(title: str) -> Optional[str]:
+    # όπως normalize_title, αλλά ένα κενό στο τέλος μένει: "Star Wars " δεν πιάνει το "Star Warsaw"
+    norm = normalize_title(title)
+    if norm is not None and title[-1:].isspace():
+        norm += " "
+    return norm
+
+
+def _fetch(node: Node, title: str) -> List[Any]:
+    return node.data.get(title, [])
+
+
+# -----------------------------
+# Routing σε processes: κάθε worker παίρνει μία φορά ένα αντίγραφο μόνο για ανάγνωση του routing state
+# (ids, leaf sets, πίνακες, χωρίς δεδομένα) και απαντά με τη θέση του κόμβου στο dht.nodes
+# -----------------------------
+_routing: Optional[Tuple[List[Node], int, Dict[int, int]]] = None  # κόμβοι, max hops, id(κόμβου) -> θέση
+
+
+def _routing_snapshot(nodes: List[Node]):
+    pos = {id(node): i for i, node in enumerate(nodes)}
+    leaves = [(node.leaf_min, node.leaf_max, array("i", [pos[id(n)] for n in node.leaf_set])) for node in nodes]
+    cells = array("i")  # τριάδες (κόμβος, κελί, κόμβος του κελιού) για τα γεμάτα κελιά
+    for i, node in enumerate(nodes):
+        for cell, n in enumerate(chain.from_iterable(node.routing_table)):
+            if n is not None:
+                cells.extend((i, cell, pos[id(n)]))
+    first = nodes[0]
+    return [node.id for node in nodes], first.b, first.leaf_size, leaves, cells
+
+
+def _init_routing(snapshot, max_hops: int) -> None:
+    global _routing
+    ids, b, leaf_size, leaves, cells = snapshot
+    nodes = [Node(node_id, b, leaf_size) for node_id in ids]
+    for node, (leaf_min, leaf_max, leaf_pos) in zip(nodes, leaves):
+        node.leaf_set = [nodes[p] for p in leaf_pos]
+        node.leaf_min, node.leaf_max = leaf_min, leaf_max
+    base = nodes[0].base
+    for i in range(0, len(cells), 3):
+        node, cell, target = cells[i], cells[i + 1], cells[i + 2]
+        nodes[node].routing_table[cell // base][cell % base] = nodes[target]
+    _routing = nodes, max_hops, {id(node): i for i, node in enumerate(nodes)}
+
+
+def _route_batch(key_ids: List[int]) -> List[Tuple[int, int]]:
+    nodes, max_hops, pos = _routing
+    out = []
+    for key_id in key_ids:
+        node, hops = nodes[0].lookup(key_id, max_hops)
+        out.append((pos[id(node)], hops))
+    return out
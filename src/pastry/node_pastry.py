@@ -1,6 +1,6 @@
-from typing import Dict, List, Any, Optional
-from collections import defaultdict
-from .utils_pastry import common_prefix_len, hex_digit_at
+from typing import List, Optional, Set
+from .utils_pastry import common_prefix_len, digit_at, ring_distance
+from ..common.column_store import ColumnStore
 
 
 
@@ -13,81 +13,186 @@ class Node:
         self.leaf_max: Optional[int] = None
 
 
-        # title -> list of movies
-        self.data: Dict[str, List[Any]] = defaultdict(list)
+        # title -> list of movies, αποθηκευμένες ανά στήλη
+        self.data: ColumnStore = ColumnStore()
 
         self.leaf_set: List["Node"] = []
         self.b = b
         self.base = 2 ** b
         self.leaf_size = leaf_size
 
+        # το routing γίνεται μόνο με ακεραίους: ψηφία των b bits πάνω σε ids των bits bits
+        self.bits = 4 * len(self.id_str)
+        self.rows = self.bits // b
+        self.digit_mask = self.base - 1
+        self.mask = (1 << self.bits) - 1
+        self.half_ring = 1 << (self.bits - 1)
+
         self.routing_table: List[List[Optional["Node"]]] = [
             [None for _ in range(self.base)]
-            for _ in range(len(self.id_str))
+            for _ in range(self.rows)
         ]
+        # όσοι κόμβοι μας έχουν στον πίνακά τους, ώστε το leave να πειράζει μόνο αυτούς
+        self.held_by: Set["Node"] = set()
 
-    def update_leaf_set(self, other: "Node"):
-        if other.id == self.id:
-            return
-
-        self.leaf_set.append(other)
-
-        # κρατάμε μοναδικούς
-        self.leaf_set = list({n.id: n for n in self.leaf_set}.values())
-
-        # sort by ID distance
-        self.leaf_set.sort(key=lambda n: abs(n.id - self.id))
-        self.leaf_set = self.leaf_set[: self.leaf_size]
-
-        # cache min / max
-        ids = [n.id for n in self.leaf_set]
-        self.leaf_min = min(ids)
-        self.leaf_max = max(ids)
+    def set_leaf_set(self, ccw: List["Node"], cw: List["Node"], whole_ring: bool) -> None:
+        # οι L/2 γείτονες αριστερόστροφα και οι L/2 δεξιόστροφα, πρώτος ο πλησιέστερος,
+        # όπως τους βγάζει το PastryDHT από το ταξινομημένο ευρετήριο των ids
+        self.leaf_set = ccw + cw
+        if not self.leaf_set:
+            self.leaf_min = self.leaf_max = None
+        elif whole_ring:
+            # το leaf set έχει όλους τους άλλους κόμβους, άρα καλύπτει όλο τον δακτύλιο
+            self.leaf_min, self.leaf_max = 0, self.mask
+        else:
+            # το τόξο [leaf_min, leaf_max] δεξιόστροφα, μπορεί να περνάει από το 0
+            self.leaf_min = ccw[-1].id
+            self.leaf_max = cw[-1].id
 
 
 
     def update_routing_table(self, other: "Node"):
-        l = common_prefix_len(self.id_str, other.id_str)
-        if l >= len(self.routing_table):
+        l = common_prefix_len(self.id, other.id, self.bits, self.b)
+        if l >= self.rows:
             return
 
-        digit = hex_digit_at(other.id_str, l)
+        digit = digit_at(other.id, l, self.bits, self.b)
         if self.routing_table[l][digit] is None:
             self.routing_table[l][digit] = other
+            other.held_by.add(self)
+
+    def replace_entry(self, gone: "Node") -> None:
+        # ο gone έφυγε: το κελί του το παίρνει ένας γείτονάς του με το ίδιο πρόθεμα, αλλιώς το ίδιο
+        # κελί από τους γείτονες του δικού μας leaf set, ώστε να μη μείνει κενό για το fallback
+        l = common_prefix_len(self.id, gone.id, self.bits, self.b)
+        d = digit_at(gone.id, l, self.bits, self.b)
+        row = self.routing_table[l]
+        if row[d] is not gone:
+            return
+        row[d] = None
+        shift = self.bits - (l + 1) * self.b
+        cell = gone.id >> shift
+        candidates = list(gone.leaf_set)
+        candidates.extend(n.routing_table[l][d] for n in self.leaf_set
+                          if common_prefix_len(self.id, n.id, self.bits, self.b) >= l)
+        for n in candidates:
+            if n is not None and n is not gone and n is not self and n.id >> shift == cell:
+                row[d] = n
+                n.held_by.add(self)
+                return
+
+    def forget_entries(self) -> None:
+        # φεύγουμε: όσοι είναι στον πίνακά μας δεν τους κρατάμε πια
+        for row in self.routing_table:
+            for n in row:
+                if n is not None:
+                    n.held_by.discard(self)
+
+    def copy_rows(self, other: "Node") -> None:
+        # join: οι γραμμές 0..l του other ισχύουν και για εμάς όταν έχουμε κοινά τα l πρώτα ψηφία
+        l = common_prefix_len(self.id, other.id, self.bits, self.b)
+        for row in other.routing_table[:l + 1]:
+            for n in row:
+                if n is not None:
+                    self.update_routing_table(n)
+        self.update_routing_table(other)
+
+    def known_nodes(self) -> List["Node"]:
+        return [n for row in self.routing_table for n in row if n is not None] + self.leaf_set
+
+    def repair_routing_table(self, max_hops: int) -> int:
+        # για κάθε κενό κελί [l][d] ρωτάμε πρώτα τους κόμβους της γραμμής l και των επόμενων (έχουν κοινά
+        # τουλάχιστον l ψηφία μαζί μας) και το leaf set για το δικό τους [l][d]. Αν κανείς δεν το έχει,
+        # κάνουμε lookup στη μέση του διαστήματος του κελιού και κοιτάμε εκεί και στο leaf set του.
+        # Επιστρέφει πόσα κελιά γέμισαν
+        filled = 0
+        for l, row in enumerate(self.routing_table):
+            peers = [n for r in self.routing_table[l:] for n in r if n is not None]
+            peers.extend(n for n in self.leaf_set
+                         if common_prefix_len(self.id, n.id, self.bits, self.b) >= l)
+            if not peers:
+                break  # οι πιο βαθιές γραμμές δεν έχουν κανέναν να ρωτήσουν
+            own = digit_at(self.id, l, self.bits, self.b)
+            shift = self.bits - (l + 1) * self.b
+            for d in range(self.base):
+                if d == own or row[d] is not None:
+                    continue
+                for peer in peers:
+                    found = peer.routing_table[l][d]
+                    if found is not None and found is not self:
+                        row[d] = found
+                        break
+                else:
+                    cell = ((self.id >> (shift + self.b)) << self.b) | d  # τα l + 1 πρώτα ψηφία του κελιού
+                    reached, _ = self.lookup((cell << shift) | (1 << shift >> 1), max_hops)
+                    for n in [reached] + reached.leaf_set:
+                        if n.id >> shift == cell:
+                            row[d] = n
+                            break
+                if row[d] is not None:
+                    row[d].held_by.add(self)
+                    filled += 1
+        return filled
+
+    def lookup(self, key_id: int, max_hops: int):
+        # route hop προς hop ξεκινώντας από εμάς, μέχρι να μη βρεθεί κάποιος πιο κοντά
+        current = self
+        hops = 0
+        while hops < max_hops:
+            hops += 1
+            next_node = current.route(key_id)
+            if next_node.id == current.id:
+                return current, hops
+            current = next_node
+        return current, hops
 
 
     def route(self, key_id: int) -> "Node":
-        key_str = hex(key_id)[2:].zfill(len(self.id_str))
-
         # 1. Έλεγχος στο Leaf Set
+        mask = self.mask
         if self.leaf_set:
-            if self.leaf_min <= key_id <= self.leaf_max:
-                closest_leaf = min(self.leaf_set + [self], key=lambda n: abs(n.id - key_id))
+            if (key_id - self.leaf_min) & mask <= (self.leaf_max - self.leaf_min) & mask:
+                # ο πλησιέστερος σε απόσταση δακτυλίου, χωρίς να φτιάχνουμε λίστα (σε ισοπαλία κερδίζει το leaf set)
+                closest_leaf = None
+                min_dist = 0
+                for n in self.leaf_set:
+                    dist = (n.id - key_id) & mask
+                    if dist > self.half_ring:
+                        dist = mask + 1 - dist
+                    if closest_leaf is None or dist < min_dist:
+                        closest_leaf, min_dist = n, dist
+                dist = (self.id - key_id) & mask
+                if min(dist, mask + 1 - dist) < min_dist:
+                    return self
                 return closest_leaf
 
         # 2. Prefix Routing (Routing Table)
-        l = common_prefix_len(self.id_str, key_str)
-        
-        # --- ΠΡΟΣΘΗΚΗ ΑΥΤΟΥ ΤΟΥ ΕΛΕΓΧΟΥ ---
-        if l == len(self.id_str):
+        # ίδιο με common_prefix_len / digit_at, γραμμένο εδώ γιατί τρέχει σε κάθε hop
+        l = max(0, self.bits - (self.id ^ key_id).bit_length()) // self.b
+        if l >= self.rows:  # ίδιο id με το key
             return self
-        # ----------------------------------
 
-        digit = hex_digit_at(key_str, l)
+        digit = (key_id >> (self.bits - (l + 1) * self.b)) & self.digit_mask
         next_node = self.routing_table[l][digit]
         
         if next_node is not None:
             return next_node
         # 3. Rare case / Fallback: Greedy routing
-        # Αν αποτύχουν τα παραπάνω, βρες οποιονδήποτε γνωστό κόμβο που μειώνει την απόσταση
-        all_known_nodes = [n for row in self.routing_table for n in row if n is not None]
-        all_known_nodes.extend(self.leaf_set)
-        
+        # Όπως στο Pastry: ένας κόμβος της γραμμής l ή του leaf set που είναι πιο κοντά στο key.
+        # Έξω από το τόξο του leaf set, το άκρο του προς το key είναι πάντα πιο κοντά, άρα υπάρχει πρόοδος
         best_node = self
-        min_dist = abs(self.id - key_id)
+        min_dist = ring_distance(self.id, key_id, mask)
         
-        for n in all_known_nodes:
-            dist = abs(n.id - key_id)
+        for n in self.routing_table[l]:
+            if n is not None:
+                dist = (n.id - key_id) & mask  # ring_distance, χωρίς κλήση συνάρτησης
+                if dist > self.half_ring:
+                    dist = mask + 1 - dist
+                if dist < min_dist:
+                    min_dist = dist
+                    best_node = n
+        for n in self.leaf_set:
+            dist = ring_distance(n.id, key_id, mask)
             if dist < min_dist:
                 min_dist = dist
                 best_node = n
@@ -100,6 +205,6 @@ class Node:
 if __name__ == "__main__":
     n = Node(12345)
     print(n.id_str)
-    n.data["Batman"].append({"id": 1})
-    n.data["Batman"].append({"id": 2})
-    print(n.data)
+    n.data.append("Batman", {"id": 1})
+    n.data.append("Batman", {"id": 2})
+    print(n.data["Batman"])
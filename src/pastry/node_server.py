@@ -0,0 +1,174 @@
+import math
+import pickle
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from ..common.hash_utils import hash_to_int
+from ..common.rpc import (KEY_ID, STEP_REPLY, Address, Cluster, ConnectionPool, RemoteRef,
+                          pack_key_value, unpack_key_value)
+from ..common.scatter_gather import remote_scan, scan
+from .dht_pastry import PastryDHT, _normalize_bound
+from .node_pastry import Node
+from .utils_pastry import normalize_title
+
+# ops που απαντά ένας node server
+OP_ROUTE = 1  # KEY_ID -> STEP_REPLY (done, node id)
+OP_GET = 2  # utf-8 normalized title -> pickled list
+OP_PUT = 3  # pack_key_value(normalized title, pickled value) -> empty
+OP_SCAN = 4  # pickled scatter_gather.Scan -> pickled [(title, movies)], ταξινομημένα
+
+
+def detach(node: Node) -> Node:
+    # αντίγραφο του κόμβου για άλλο process: οι γνωστοί κόμβοι γίνονται RemoteRef
+    local = Node(node.id, node.b, node.leaf_size)
+    local.leaf_set = [RemoteRef(n.id) for n in node.leaf_set]
+    local.leaf_min, local.leaf_max = node.leaf_min, node.leaf_max
+    local.routing_table = [[RemoteRef(n.id) if n is not None else None for n in row] for row in node.routing_table]
+    local.data = node.data
+    return local
+
+
+class PastryHandler:
+    def __init__(self, node: Node):
+        self.node = node
+
+    def handle(self, op: int, payload: bytes) -> bytes:
+        node = self.node
+        if op == OP_ROUTE:
+            (key_id,) = KEY_ID.unpack(payload)
+            next_node = node.route(key_id)
+            return STEP_REPLY.pack(int(next_node.id == node.id), next_node.id)
+        if op == OP_GET:
+            return pickle.dumps(node.data.get(payload.decode("utf-8"), []), protocol=pickle.HIGHEST_PROTOCOL)
+        if op == OP_PUT:
+            title, value = unpack_key_value(payload)
+            node.data.append(title, pickle.loads(value))
+            return b""
+        if op == OP_SCAN:
+            return pickle.dumps(scan(node.data, pickle.loads(payload)), protocol=pickle.HIGHEST_PROTOCOL)
+        raise ValueError(f"unknown op {op}")
+
+
+def serve_dht(dht: PastryDHT, base_port: int = 31000, processes: int = 4) -> Tuple[Cluster, Dict[int, Address]]:
+    handlers = [PastryHandler(detach(node)) for node in dht.nodes]
+    cluster = Cluster(handlers, base_port=base_port, processes=processes)
+    return cluster, {node.id: address for node, address in zip(dht.nodes, cluster.addresses())}
+
+
+class RemotePastry:
+    """Client ενός Pastry δακτυλίου που τρέχει σε node servers, ένα RPC ανά hop"""
+
+    def __init__(self, directory: Dict[int, Address], entry: int, m_bits: int = 64, pool: ConnectionPool = None):
+        self.directory = directory  # node id -> address
+        self.entry = entry  # ίδιο σημείο εισόδου με το PastryDHT.route_key (nodes[0])
+        self.m_bits = m_bits
+        self.max_hops = int(math.log2(len(directory))) + 2  # ίδιο όριο με το route_key
+        self.pool = pool if pool is not None else ConnectionPool()
+
+    def route_key(self, key_id: int) -> Tuple[int, int]:
+        current = self.entry
+        hops = 0
+        while hops < self.max_hops:
+            hops += 1
+            done, next_id = STEP_REPLY.unpack(self.pool.call(self.directory[current], OP_ROUTE, KEY_ID.pack(key_id)))
+            if done:
+                return current, hops
+            current = next_id
+        return current, hops
+
+    def route_many(self, key_ids: List[int]) -> Tuple[List[int], List[int]]:
+        # κάθε γύρος προχωρά όλα τα keys κατά ένα hop, ένα pipelined batch ανά κόμβο
+        owners = [self.entry] * len(key_ids)
+        hops = [0] * len(key_ids)
+        at: Dict[int, List[int]] = {self.entry: list(range(len(key_ids)))} if key_ids else {}
+        for _ in range(self.max_hops):
+            if not at:
+                break
+            replies = self.pool.scatter({self.directory[node_id]: [(OP_ROUTE, KEY_ID.pack(key_ids[i])) for i in waiting]
+                                         for node_id, waiting in at.items()})
+            next_at: Dict[int, List[int]] = {}
+            for node_id, waiting in at.items():
+                for i, reply in zip(waiting, replies[self.directory[node_id]]):
+                    done, next_id = STEP_REPLY.unpack(reply)
+                    hops[i] += 1
+                    if not done:
+                        owners[i] = next_id
+                        next_at.setdefault(next_id, []).append(i)
+            at = next_at
+        return owners, hops
+
+    def get(self, title: str):
+        norm_title = normalize_title(title)
+        if norm_title is None:
+            return [], 0, None
+        node_id, hops = self.route_key(hash_to_int(norm_title, self.m_bits))
+        results = pickle.loads(self.pool.call(self.directory[node_id], OP_GET, norm_title.encode("utf-8")))
+        return results, hops, hex(node_id)[2:].zfill(16)
+
+    def get_many(self, titles: Iterable[str]) -> List[Tuple[List[Any], int, Any]]:
+        norm = [normalize_title(t) for t in titles]
+        todo = [i for i, t in enumerate(norm) if t is not None]
+        owners, hops = self.route_many([hash_to_int(norm[i], self.m_bits) for i in todo])
+        by_owner: Dict[int, List[int]] = {}
+        for j, owner in enumerate(owners):
+            by_owner.setdefault(owner, []).append(j)
+        replies = self.pool.scatter({self.directory[owner]: [(OP_GET, norm[todo[j]].encode("utf-8")) for j in js]
+                                     for owner, js in by_owner.items()})
+        out: List[Tuple[List[Any], int, Any]] = [([], 0, None)] * len(norm)
+        for owner, js in by_owner.items():
+            for j, reply in zip(js, replies[self.directory[owner]]):
+                out[todo[j]] = (pickle.loads(reply), hops[j], hex(owner)[2:].zfill(16))
+        return out
+
+    def put(self, title: str, value: Any):
+        norm_title = normalize_title(title)
+        if norm_title is None:
+            return None
+        node_id, _ = self.route_key(hash_to_int(norm_title, self.m_bits))
+        self.pool.call(self.directory[node_id], OP_PUT,
+                       pack_key_value(norm_title, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)))
+        return node_id
+
+    def prefix_query(self, prefix: str, limit: Optional[int] = None) -> Iterator[Tuple[str, str, List[Any]]]:
+        # όλοι οι node servers ψάχνουν ταυτόχρονα, όπως το PastryDHT.prefix_query
+        norm = _normalize_bound(prefix)
+        if norm is None:
+            return iter(())
+        return self._scan(("prefix", norm, None, limit))
+
+    def range_query(self, lo: str, hi: Optional[str] = None, limit: Optional[int] = None) -> Iterator[Tuple[str, str, List[Any]]]:
+        return self._scan(("range", _normalize_bound(lo) or "", _normalize_bound(hi) if hi is not None else None, limit))
+
+    def _scan(self, request) -> Iterator[Tuple[str, str, List[Any]]]:
+        for title, node_id, movies in remote_scan(self.pool, self.directory, OP_SCAN, request):
+            yield title, hex(node_id)[2:].zfill(16), movies
+
+    def close(self) -> None:
+        self.pool.close()
+
+
+if __name__ == "__main__":
+    # python -m src.pastry.node_server, από τη ρίζα του repository
+    import time
+
+    dht = PastryDHT(m_bits=64)
+    for i in range(64):
+        dht.join(f"Node{i}")
+    for i in range(20000):
+        dht.put(f"movie {i}", i, {"id": i})
+    titles = [f"movie {i}" for i in range(0, 20000, 10)]
+
+    cluster, directory = serve_dht(dht, processes=4)
+    with cluster:
+        client = RemotePastry(directory, dht.nodes[0].id, dht.m_bits)
+        t0 = time.perf_counter()
+        one_by_one = [client.get(t) for t in titles]
+        t1 = time.perf_counter()
+        batched = client.get_many(titles)
+        t2 = time.perf_counter()
+        client.close()
+
+    assert [(h, n) for _, h, n in one_by_one] == [(h, n) for _, h, n in batched]
+    print(f"{len(titles)} gets over {len(directory)} node servers, "
+          f"avg hops {sum(h for _, h, _ in batched) / len(batched):.2f}")
+    print(f"  one RPC at a time: {len(titles) / (t1 - t0):9.0f} gets/s")
+    print(f"  pipelined rounds:  {len(titles) / (t2 - t1):9.0f} gets/s")
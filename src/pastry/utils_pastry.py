@@ -24,12 +24,20 @@ def normalize_title(title) -> str:
     return title
 
 
-def common_prefix_len(a: str, b: str) -> int:
-    i = 0
-    while i < min(len(a), len(b)) and a[i] == b[i]:
-        i += 1
-    return i
+def common_prefix_len(a: int, b: int, bits: int, digit_bits: int) -> int:
+    # πλήθος κοινών αρχικών ψηφίων (των digit_bits bits) δύο ids με bits bits, από το XOR τους
+    x = a ^ b
+    if x == 0:
+        return bits // digit_bits
+    return max(0, bits - x.bit_length()) // digit_bits
 
 
-def hex_digit_at(s: str, idx: int) -> int:
-    return int(s[idx], 16)
+def ring_distance(a: int, b: int, mask: int) -> int:
+    # απόσταση πάνω στον δακτύλιο, από όποια πλευρά είναι μικρότερη
+    d = (a - b) & mask
+    return min(d, (b - a) & mask)
+
+
+def digit_at(x: int, idx: int, bits: int, digit_bits: int) -> int:
+    # το ψηφίο idx (από τα αριστερά) με shift/mask
+    return (x >> (bits - (idx + 1) * digit_bits)) & ((1 << digit_bits) - 1)
@@ -1,69 +1,41 @@
-
-from concurrent.futures import ProcessPoolExecutor
-import pandas as pd
 import time
 from DHT import DHT
-import pickle
+from snapshot import save_snapshot
+from src.common.ingest import stream, key_value_records
 import csv
 import os
 
 
-def make_chunks(n_rows: int, batch_size: int):
-    chunks = []
-    for start in range(0, n_rows, batch_size):
-        end = min(start + batch_size, n_rows)
-        chunks.append((start, end))
-    return chunks
+MOVIE_COLUMNS = ["id", "release_date", "title"]
 
-def process_chunk(start: int, end: int):
-    df = pd.read_csv(CSV_PATH, skiprows=range(1, start + 1), nrows=end - start)
-    out = []
-    for _, row in df.iterrows():
-        filtered_data = {
-            "id": row.get("id"),
-            "release_date": row.get("release_date"),
-            "title": row.get("title")
-        }
-        out.append((row["title"], filtered_data))
-    return out
+def movie_records(df):
+    return key_value_records(df, "title", MOVIE_COLUMNS)
 
 
 CSV_PATH = r"C:/Users/tasis/Desktop/sxoli/DISTRIBUTED_SYSTEMS/output.csv"
 LOOKUP_PATH = r"C:/Users/tasis/Desktop/sxoli/DISTRIBUTED_SYSTEMS/random_movie_names.csv"
 replication_factor = 3
-
-
-
-df_info = pd.read_csv(CSV_PATH, usecols=["title"])
-n_rows = len(df_info)
 batch_size = 50000
-chunks = make_chunks(n_rows, batch_size)
 
 def make_nodes(d : DHT, number: int) -> float:
     start_time = time.perf_counter()
-    for i in range(number):
-        d.join(f"node{i}")
+    d.bulk_join(f"node{i}" for i in range(number))
     end_time = time.perf_counter()
     return 1000000*(end_time - start_time)
     
 def insert_keys(d: DHT) -> float:
     start_time = time.perf_counter()
-    with ProcessPoolExecutor(max_workers=os.cpu_count()) as ex:
-        futures = [ex.submit(process_chunk, s, e) for (s, e) in chunks]
-        for fut in futures:
-            pairs = fut.result()
-            for title, attrs in pairs:
-                d.put(title, attrs, replication_factor)
+    chunks = stream(CSV_PATH, chunksize=batch_size, usecols=MOVIE_COLUMNS)
+    d.put_many_parallel(chunks, replication_factor, convert=movie_records)
     end_time = time.perf_counter()
 
-    with open("C:/Users/tasis/Desktop/sxoli/DISTRIBUTED_SYSTEMS/my_dht.pkl", "wb") as f:
-            pickle.dump(d, f)
+    save_snapshot(d, "C:/Users/tasis/Desktop/sxoli/DISTRIBUTED_SYSTEMS/my_dht.snap")
 
-    size_bytes = os.path.getsize("C:/Users/tasis/Desktop/sxoli/DISTRIBUTED_SYSTEMS/my_dht.pkl")
+    size_bytes = os.path.getsize("C:/Users/tasis/Desktop/sxoli/DISTRIBUTED_SYSTEMS/my_dht.snap")
     size_kb = size_bytes / 1024
     size_mb = size_kb / 1024
 
-    os.remove("C:/Users/tasis/Desktop/sxoli/DISTRIBUTED_SYSTEMS/my_dht.pkl")
+    os.remove("C:/Users/tasis/Desktop/sxoli/DISTRIBUTED_SYSTEMS/my_dht.snap")
 
     return size_mb
 
@@ -71,10 +43,9 @@ def lookups(d : DHT) -> float:
     hops = 0
     start_time = time.perf_counter()
     with open(LOOKUP_PATH, newline='', encoding='utf-8') as f:
-        reader = csv.reader(f)
-        for row in reader:
-            key, owner, movie_list, hop = d.get(row[0])[0]
-            hops = hops + hop
+        titles = [row[0] for row in csv.reader(f)]
+    for key, owner, movie_list, hop in d.get_many(titles):
+        hops = hops + hop
     end_time = time.perf_counter()
     return hops / 29912
 
@@ -0,0 +1,64 @@
+import random
+
+from DHT import DHT
+
+M_BITS = 16
+NAMES = [f"node{i}" for i in range(500)] #4 pairs of these names hash onto the same 16-bit id
+
+
+def _fingers(d: DHT):
+    return [[d.table[s].id for s in node.fingers] for node in d.nodes]
+
+
+def test_join_skips_colliding_ids():
+    d = DHT(M_BITS)
+    for name in NAMES:
+        try:
+            d.join(name)
+        except ValueError: #its only position is taken
+            pass
+    assert len(set(d.ids)) == len(d.ids) == len(d.nodes) == 496
+    incremental = _fingers(d)
+    d._rebuild_finger_tables()
+    assert incremental == _fingers(d)
+
+    bulk = DHT.from_node_names(NAMES, M_BITS)
+    assert bulk.ids == d.ids
+    rng = random.Random(0)
+    keys = [rng.getrandbits(M_BITS) for _ in range(2000)]
+    assert [d.find_successor(k)[0].id for k in keys] == [bulk.find_successor(k)[0].id for k in keys]
+    assert sum(d.find_successor(k)[1] for k in keys) / len(keys) < 8
+
+
+def _pointers(d: DHT):
+    def node_id(node):
+        return node.id if node is not None and node.alive else None
+    return [(node.live_successor().id, node_id(node.predecessor), [s.id for s in node.successors if s.alive],
+             [d.table[s].id if d.table[s] is not None else node.id for s in node.fingers]) for node in d.nodes]
+
+
+def test_snapshot_keeps_an_unconverged_ring(tmp_path):
+    from snapshot import load_snapshot, save_snapshot
+
+    d = DHT.from_node_names([f"node{i}" for i in range(100)], 64)
+    d.put_many(((f"k{i}", {"i": i}) for i in range(2000)), 3)
+    rng = random.Random(1)
+    for node in rng.sample(d.nodes, 15):
+        d.fail(node)
+    for i in range(10):
+        d.join_lazy(f"new{i}")
+    d.stabilize_round()
+    path = str(tmp_path / "ring.snap")
+    save_snapshot(d, path)
+    loaded = load_snapshot(path)
+
+    assert loaded.ids == d.ids
+    assert _pointers(loaded) == _pointers(d)
+    probes = [rng.getrandbits(64) for _ in range(500)]
+    assert loaded.ring_health(probes) == d.ring_health(probes)
+    assert loaded.ring_health(probes)["successors_ok"] < 1.0 #not silently replaced by the ideal ring
+    keys = [f"k{i}" for i in range(2000)]
+    assert [(k, node.id, values, hops) for k, node, values, hops in loaded.get_many(keys)] == \
+           [(k, node.id, values, hops) for k, node, values, hops in d.get_many(keys)]
+    loaded.converge()
+    assert loaded.ring_health(probes)["lookups_ok"] == 1.0